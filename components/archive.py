@@ -0,0 +1,174 @@
+import datetime
+import io
+import os
+import queue
+import threading
+import traceback
+import chess
+import chess.pgn
+
+# every finished game goes into one pgn file, with a small index next to it so a game can be found
+# (and read with a single seek) without parsing the whole archive. each index line is
+# offset, length, date, result, player colour, ply count - separated by tabs
+
+ARCHIVE_PATH = "games/archive.pgn"
+
+PLAYER_NAME = "player"
+ENGINE_NAME = "tinychess"
+
+class GameArchive:
+    def __init__(self, path=ARCHIVE_PATH):
+        self.path = path
+        self.index_path = os.path.splitext(path)[0] + ".idx"
+
+    def append(self, game):
+        # game is a chess.pgn.Game, returns its index entry
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory) # create the directory if it doesn't exist
+
+        self.index() # makes sure the index is there and up to date before we add to it
+        data = (str(game) + "\n\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(data)
+        entry = make_entry(offset, len(data), game.headers)
+        with open(self.index_path, "a") as f:
+            f.write(format_entry(entry))
+        return entry
+
+    def index(self):
+        # every entry in the index, rebuilt from the archive first if it's missing or out of date
+        if not os.path.exists(self.path):
+            return []
+        entries = self.read_index()
+        archive_size = os.path.getsize(self.path)
+        end = entries[-1]["offset"] + entries[-1]["length"] if entries else 0
+        if end != archive_size:
+            entries = self.rebuild_index()
+        return entries
+
+    def read_index(self):
+        if not os.path.exists(self.index_path):
+            return []
+        entries = []
+        with open(self.index_path) as f:
+            for line in f:
+                try:
+                    entries.append(parse_entry(line))
+                except ValueError:
+                    return [] # a broken index is the same as no index
+        return entries
+
+    def rebuild_index(self):
+        # goes through the archive once, reading just the headers of each game
+        entries = []
+        with open(self.path, "rb") as f:
+            data = f.read()
+        for offset, length in split_games(data):
+            text = data[offset:offset + length].decode("utf-8", errors="replace")
+            headers = chess.pgn.read_headers(io.StringIO(text))
+            if headers is not None:
+                entries.append(make_entry(offset, length, headers))
+        with open(self.index_path, "w") as f:
+            for entry in entries:
+                f.write(format_entry(entry))
+        return entries
+
+    def find(self, result=None, colour=None, date=None):
+        # entries matching everything that's given, e.g. find(result="1-0", colour="white")
+        return [
+            entry for entry in self.index()
+            if (result is None or entry["result"] == result)
+            and (colour is None or entry["colour"] == colour)
+            and (date is None or entry["date"] == date)
+        ]
+
+    def read_game(self, entry):
+        with open(self.path, "rb") as f:
+            f.seek(entry["offset"])
+            text = f.read(entry["length"]).decode("utf-8")
+        return chess.pgn.read_game(io.StringIO(text))
+
+def split_games(data):
+    # (offset, length) of every game in a pgn file, a game starts at a header line after a blank line
+    starts = []
+    previous_blank = True
+    in_moves = False
+    position = 0
+    for line in data.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped.startswith(b"[") and (not starts or (in_moves and previous_blank)):
+            starts.append(position)
+            in_moves = False
+        elif stripped and not stripped.startswith(b"["):
+            in_moves = True
+        previous_blank = not stripped
+        position += len(line)
+    ends = starts[1:] + [len(data)]
+    return [(start, end - start) for start, end in zip(starts, ends)]
+
+def make_entry(offset, length, headers):
+    if headers.get("White") == PLAYER_NAME:
+        colour = "white"
+    elif headers.get("Black") == PLAYER_NAME:
+        colour = "black"
+    else:
+        colour = "-"
+    return {
+        "offset": offset,
+        "length": length,
+        "date": headers.get("Date", "????.??.??"),
+        "result": headers.get("Result", "*"),
+        "colour": colour,
+        "plies": int(headers.get("PlyCount", "0") or 0),
+    }
+
+def format_entry(entry):
+    return f"{entry['offset']}\t{entry['length']}\t{entry['date']}\t{entry['result']}\t{entry['colour']}\t{entry['plies']}\n"
+
+def parse_entry(line):
+    offset, length, date, result, colour, plies = line.rstrip("\n").split("\t")
+    return {"offset": int(offset), "length": int(length), "date": date, "result": result, "colour": colour, "plies": int(plies)}
+
+def game_from_board(board, player, when, version=""):
+    game = chess.pgn.Game.from_board(board)
+    game.headers["Event"] = "tinychess"
+    game.headers["Date"] = when.strftime("%Y.%m.%d")
+    game.headers["Time"] = when.strftime("%H:%M:%S")
+    engine_name = f"{ENGINE_NAME} {version}".strip()
+    game.headers["White"] = PLAYER_NAME if player == chess.WHITE else engine_name
+    game.headers["Black"] = PLAYER_NAME if player == chess.BLACK else engine_name
+    game.headers["PlyCount"] = str(len(board.move_stack))
+    return game
+
+class ArchiveWriter:
+    # saves games on a background thread so the ui never waits for the disk
+
+    def __init__(self, archive=None, version=""):
+        self.archive = archive or GameArchive()
+        self.version = version
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def save(self, board, player):
+        # player is the colour the human played, the board is copied so it can be reset straight away
+        self.queue.put((board.copy(), player, datetime.datetime.now()))
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            board, player, when = job
+            try:
+                self.archive.append(game_from_board(board, player, when, self.version))
+            except Exception as e:
+                print(f"error when saving game: {e}")
+                traceback.print_exc()
+
+    def close(self):
+        # waits for anything still queued to be written
+        self.queue.put(None)
+        self.thread.join()
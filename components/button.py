@@ -1,6 +1,8 @@
 import pygame
 import traceback
 
+from components.text import get_text_surface
+
 colours = {
     "black": (0, 0, 0),
     "grey": (100, 100, 100),
@@ -44,7 +46,7 @@ class Button:
 
     def render(self):
         pygame.draw.rect(self.window, self.buttoncolour, self.buttonrect, border_radius=10)   # draw the button's rectangle
-        textsurf = self.buttonfont.render(self.text, True, self.textcolour) # render the text to surface
+        textsurf = get_text_surface(self.buttonfont, self.text, self.textcolour) # render the text to surface (or reuse it)
         textrect = textsurf.get_rect()                                      # get the rectangle of the text surface                
         textrect.center = (self.x + self.width/2, self.y + self.height/2)   # center the text rectangle in the button rectangle
         self.window.blit(textsurf, textrect)                                # blit the text surface to the window
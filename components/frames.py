@@ -0,0 +1,45 @@
+import time
+import pygame
+
+class FrameScheduler:
+    # paces the main loop. after a frame that changed something it runs at full speed, otherwise it
+    # sleeps in pygame.event.wait until there's input, a custom event (like the engine finishing)
+    # or a deadline someone asked to be woken up for
+
+    def __init__(self, fps=60, max_idle=0.5):
+        self.clock = pygame.time.Clock()
+        self.fps = fps
+        self.max_idle = max_idle # seconds, just so nothing can ever sleep forever
+        self.busy = True
+        self.wake_at = None
+
+    def keep_busy(self):
+        # something changed this frame, so the next one runs right away in case more follows
+        self.busy = True
+
+    def wake_up_at(self, deadline):
+        # deadline is a time.monotonic() time, only counts for the next wait
+        if self.wake_at is None or deadline < self.wake_at:
+            self.wake_at = deadline
+
+    def events(self):
+        if self.busy:
+            self.busy = False
+            self.wake_at = None
+            self.clock.tick(self.fps)
+            return pygame.event.get()
+
+        timeout = self.max_idle
+        if self.wake_at is not None:
+            timeout = min(timeout, self.wake_at - time.monotonic())
+            self.wake_at = None
+
+        timeout_ms = int(timeout * 1000)
+        if timeout_ms < 1: # event.wait(0) would wait forever
+            return pygame.event.get()
+
+        event = pygame.event.wait(timeout_ms)
+        self.clock.tick() # keeps the next busy frame from thinking it's late
+        if event.type == pygame.NOEVENT:
+            return []
+        return [event] + pygame.event.get()
@@ -0,0 +1,212 @@
+import chess
+import numpy as np
+
+from components.game import engine
+from components.game.values import PIECES_VALUES, PIECES_VALUES_INVERSE
+
+# the position-only parts of the move score worked out for a whole batch of positions at once with numpy:
+# every position is packed into 12 bitboards (one per colour and piece type), attacks are found with shifts
+# and fills over the whole batch, and each feature ends up as an array with one row per position.
+# gives the same numbers as engine.static_move_score and friends (tools/batch_parity.py checks that), it's just
+# cheaper per position once there are enough of them, e.g. every child of a root or a chunk of analysed games.
+# numpy is only needed by this module, nothing the game imports pulls it in
+
+FILE_A = np.uint64(chess.BB_FILE_A)
+FILE_H = np.uint64(chess.BB_FILE_H)
+NOT_A = ~FILE_A
+NOT_H = ~FILE_H
+NOT_AB = ~(FILE_A | np.uint64(chess.BB_FILE_B))
+NOT_GH = ~(FILE_H | np.uint64(chess.BB_FILE_G))
+ALL = ~np.uint64(0)
+
+# (shift, squares a piece can land on after it) with a positive shift moving up the board, negative down
+ROOK_DIRECTIONS = [(8, ALL), (-8, ALL), (1, NOT_A), (-1, NOT_H)]
+BISHOP_DIRECTIONS = [(9, NOT_A), (7, NOT_H), (-7, NOT_A), (-9, NOT_H)]
+KING_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+KNIGHT_DIRECTIONS = [(17, NOT_A), (15, NOT_H), (10, NOT_AB), (6, NOT_GH), (-6, NOT_AB), (-10, NOT_GH), (-15, NOT_A), (-17, NOT_H)]
+PAWN_DIRECTIONS = {chess.WHITE: [(9, NOT_A), (7, NOT_H)], chess.BLACK: [(-7, NOT_A), (-9, NOT_H)]}
+
+CENTRE = [chess.D4, chess.E4, chess.D5, chess.E5]
+
+VALUES = np.array([0] + [PIECES_VALUES[piece_type] for piece_type in chess.PIECE_TYPES]) # indexed by piece type, 0 for empty
+NO_ATTACKER = 1000 # cheapest attacker value for squares nobody attacks
+
+def shift(bitboards, amount):
+    if amount > 0:
+        return bitboards << np.uint64(amount)
+    return bitboards >> np.uint64(-amount)
+
+def fill(pieces, empty, amount, mask):
+    # every square the pieces slide to in one direction, stopping on (and including) the first piece in the way
+    empty = empty & mask
+    pieces = pieces | empty & shift(pieces, amount)
+    empty = empty & shift(empty, amount)
+    pieces = pieces | empty & shift(pieces, amount * 2)
+    empty = empty & shift(empty, amount * 2)
+    pieces = pieces | empty & shift(pieces, amount * 4)
+    return shift(pieces, amount) & mask
+
+def square_bits(bitboards):
+    # (n,) uint64 -> (n, 64) of 0/1, column i is square i
+    return np.unpackbits(bitboards.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+
+def pack_into(packed, row, board):
+    for colour in chess.COLORS:
+        for piece_type in chess.PIECE_TYPES:
+            packed[row, int(colour), piece_type] = board.pieces_mask(piece_type, colour)
+
+def pack(boards):
+    # (n, 2, 7) uint64: pieces of each colour and type (index 0 unused, so piece types index directly)
+    packed = np.zeros((len(boards), 2, 7), dtype=np.uint64)
+    for row, board in enumerate(boards):
+        pack_into(packed, row, board)
+    return packed
+
+class PositionBatch:
+    # features of many positions at once, from pack(). attack tables are worked out the first time something needs them
+
+    @classmethod
+    def from_boards(cls, boards):
+        return cls(pack(boards))
+
+    def __init__(self, pieces):
+        self.count = len(pieces)
+        self.pieces = pieces
+        self.occupied = np.bitwise_or.reduce(self.pieces.reshape(self.count, -1), axis=1)
+        self.types = np.zeros((self.count, 64), dtype=np.int64) # piece type on every square, 0 if empty
+        self.colours = np.zeros((self.count, 64), dtype=np.int64) # 1 for white, 0 for black or empty
+        for colour in chess.COLORS:
+            for piece_type in chess.PIECE_TYPES:
+                bits = square_bits(self.pieces[:, int(colour), piece_type])
+                self.types += bits * piece_type
+                if colour == chess.WHITE:
+                    self.colours += bits
+        self.attacker_score = None # (2, n, 64) summed PIECES_VALUES_INVERSE of each colour's attackers
+        self.cheapest_attacker = None # (2, n, 64) lowest PIECES_VALUES among each colour's attackers, NO_ATTACKER if none
+
+    def material(self):
+        # (n, 2) summed PIECES_VALUES for black and white
+        counts = np.zeros((self.count, 2), dtype=np.int64)
+        for colour in chess.COLORS:
+            for piece_type in chess.PIECE_TYPES:
+                counts[:, int(colour)] += square_bits(self.pieces[:, int(colour), piece_type]).sum(axis=1).astype(np.int64) * PIECES_VALUES[piece_type]
+        return counts
+
+    def attacks(self):
+        if self.attacker_score is not None:
+            return
+        empty = ~self.occupied
+        self.attacker_score = np.zeros((2, self.count, 64), dtype=np.int64)
+        self.cheapest_attacker = np.full((2, self.count, 64), NO_ATTACKER, dtype=np.int64)
+        for colour in chess.COLORS:
+            c = int(colour)
+            by_type = {
+                chess.PAWN: [shift(self.pieces[:, c, chess.PAWN], amount) & mask for amount, mask in PAWN_DIRECTIONS[colour]],
+                chess.KNIGHT: [shift(self.pieces[:, c, chess.KNIGHT], amount) & mask for amount, mask in KNIGHT_DIRECTIONS],
+                chess.BISHOP: [fill(self.pieces[:, c, chess.BISHOP], empty, amount, mask) for amount, mask in BISHOP_DIRECTIONS],
+                chess.ROOK: [fill(self.pieces[:, c, chess.ROOK], empty, amount, mask) for amount, mask in ROOK_DIRECTIONS],
+                chess.QUEEN: [fill(self.pieces[:, c, chess.QUEEN], empty, amount, mask) for amount, mask in KING_DIRECTIONS],
+                chess.KING: [shift(self.pieces[:, c, chess.KING], amount) & mask for amount, mask in KING_DIRECTIONS],
+            }
+            for piece_type, directions in by_type.items():
+                # a square can only be hit once per direction by a piece type, so adding the directions up counts attackers
+                count = sum(square_bits(attacks).astype(np.int64) for attacks in directions)
+                self.attacker_score[c] += count * PIECES_VALUES_INVERSE[piece_type]
+                self.cheapest_attacker[c] = np.where(count > 0, np.minimum(self.cheapest_attacker[c], PIECES_VALUES[piece_type]), self.cheapest_attacker[c])
+
+    def is_defended(self, squares, colours):
+        # (n,) bool, same as engine.is_piece_adequately_defended(board, square, colour) for each row
+        self.attacks()
+        rows = np.arange(self.count)
+        squares = np.asarray(squares)
+        mine = np.asarray(colours).astype(np.int64)
+        theirs = 1 - mine
+        piece_type = self.types[rows, squares]
+        cheaper = self.cheapest_attacker[theirs, rows, squares] < VALUES[piece_type]
+        outnumbered = self.attacker_score[theirs, rows, squares] > self.attacker_score[mine, rows, squares]
+        return (piece_type > 0) & ~cheaper & ~outnumbered
+
+    def defended_squares(self, colour):
+        # (n, 64) bool, is_defended for every square holding a piece of colour
+        self.attacks()
+        c = int(colour)
+        cheaper = self.cheapest_attacker[1 - c] < VALUES[self.types]
+        outnumbered = self.attacker_score[1 - c] > self.attacker_score[c]
+        return ~cheaper & ~outnumbered
+
+    def hanging_value(self, colour):
+        # (n,) same as engine.value_of_pieces_hanging(board, colour)
+        mine = (self.types > 0) & (self.colours == int(colour))
+        hanging = mine & ~self.defended_squares(colour)
+        return (VALUES[self.types] * hanging).sum(axis=1)
+
+    def in_check(self, colours):
+        # (n,) bool, is the king of colour attacked
+        self.attacks()
+        rows = np.arange(self.count)
+        mine = np.asarray(colours).astype(np.int64)
+        kings = self.pieces[rows, mine, chess.KING]
+        king_squares = np.argmax(square_bits(kings), axis=1)
+        return self.cheapest_attacker[1 - mine, rows, king_squares] < NO_ATTACKER
+
+def moves_into_centre(from_squares, to_squares):
+    # (n,) bool, engine.moves_into_centre for each move
+    return np.isin(from_squares, CENTRE) | np.isin(to_squares, CENTRE)
+
+def score_children(board, colour=None):
+    # the position-only terms of get_move_goodness (check, promotion, capture, square safety, king move, hanging pieces
+    # and centre) for every legal move at once, as [(move, score)]. leaves out what needs move generation or the game
+    # history: checkmate, stalemate, the opponent's replies and repetition
+    colour = board.turn if colour is None else colour
+    moves = list(board.legal_moves)
+    if not moves:
+        return []
+    if engine.USE_SEE: # static exchange isn't done in numpy, score them one at a time so the flag still means the same thing
+        scratch = board.copy(stack=False)
+        return [(move, engine.static_move_score(scratch, move, colour)) for move in moves]
+
+    scratch = board.copy(stack=False)
+    packed = np.zeros((len(moves), 2, 7), dtype=np.uint64)
+    captured = np.zeros(len(moves), dtype=np.int64)
+    for i, move in enumerate(moves):
+        if scratch.is_en_passant(move):
+            captured[i] = chess.PAWN
+        elif scratch.is_capture(move):
+            captured[i] = scratch.piece_type_at(move.to_square)
+        scratch.push(move)
+        pack_into(packed, i, scratch)
+        scratch.pop()
+
+    batch = PositionBatch(packed)
+    rows = np.arange(len(moves))
+    from_squares = np.array([move.from_square for move in moves])
+    to_squares = np.array([move.to_square for move in moves])
+    promotions = np.array([move.promotion or 0 for move in moves])
+    moving = np.array([board.piece_type_at(move.from_square) for move in moves])
+    colours = np.full(len(moves), int(colour))
+
+    defended = batch.is_defended(to_squares, colours)
+    score = np.zeros(len(moves), dtype=np.int64)
+
+    gives_check = batch.in_check(1 - colours)
+    score += np.where(gives_check, np.where(defended, 10, -10), 0)
+
+    promoted = promotions > 0
+    score += np.where(promoted, np.where(defended, VALUES[promotions], -(VALUES[promotions] + PIECES_VALUES[chess.PAWN])), 0)
+
+    captured_value = np.round(VALUES[captured] * 4).astype(np.int64)
+    capturing_value = VALUES[moving]
+    trade = captured_value - capturing_value
+    capture_score = np.where(captured_value > capturing_value, trade, np.where(defended, trade, -trade))
+    score += np.where(captured > 0, capture_score, 0)
+
+    score += np.where(defended, 1, -VALUES[batch.types[rows, to_squares]])
+
+    score += np.where(moving == chess.KING, -10, 0) # same as the scalar scorer, which asks is_castling after the move is made
+
+    score -= batch.hanging_value(colour)
+    score += batch.hanging_value(not colour) // 2
+
+    score += np.where(moves_into_centre(from_squares, to_squares), 2, 0)
+
+    return list(zip(moves, score.tolist()))
@@ -0,0 +1,157 @@
+import mmap
+import os
+import chess
+
+from components.game.book import resource_path
+from components.game.search import MATE
+
+# endgame bitbases: for every position of a small ending, how many plies until the strong side mates (or that it can't).
+# one byte per position, 0 for a draw (or an impossible position), otherwise plies to mate + 1.
+# the strong side is always stored as white, with its king folded into one corner of the board by symmetry,
+# so a table is 10 (or 32 with a pawn) king squares * 64 per other piece * 2 sides to move bytes.
+# built offline by tools/build_bitbases.py, memory-mapped the first time a matching position is probed
+
+BITBASE_DIR = "assets/bitbases"
+
+ENDGAMES = { # name -> the strong side's pieces besides its king, in the order they're indexed
+    "KQK": (chess.QUEEN,),
+    "KRK": (chess.ROOK,),
+    "KPK": (chess.PAWN,),
+    "KBNK": (chess.BISHOP, chess.KNIGHT),
+}
+
+NAME_ORDER = (chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT, chess.PAWN)
+
+TRIANGLE = [chess.A1, chess.B1, chess.C1, chess.D1, chess.B2, chess.C2, chess.D2, chess.C3, chess.D3, chess.D4]
+TRIANGLE_SLOT = {square: slot for slot, square in enumerate(TRIANGLE)}
+
+def has_pawns(name):
+    return chess.PAWN in ENDGAMES[name]
+
+def king_slots(name):
+    return 32 if has_pawns(name) else len(TRIANGLE)
+
+def table_size(name):
+    return king_slots(name) * 64 ** (len(ENDGAMES[name]) + 1) * 2
+
+def transpose(square):
+    return chess.square(chess.square_rank(square), chess.square_file(square))
+
+def canonical(name, squares):
+    # squares is [strong king, *pieces, weak king], mirrored until the strong king is in the stored part of the board
+    king = squares[0]
+    if chess.square_file(king) > 3:
+        squares = [square ^ 7 for square in squares]
+    if has_pawns(name):
+        return squares # pawns only go one way, so left-right is the only symmetry
+    if chess.square_rank(squares[0]) > 3:
+        squares = [square ^ 56 for square in squares]
+    if chess.square_rank(squares[0]) > chess.square_file(squares[0]):
+        squares = [transpose(square) for square in squares]
+    return squares
+
+def stored_index(name, squares, strong_to_move):
+    squares = canonical(name, squares)
+    king = squares[0]
+    index = (chess.square_rank(king) * 4 + chess.square_file(king)) if has_pawns(name) else TRIANGLE_SLOT[king]
+    for square in squares[1:]:
+        index = index * 64 + square
+    return index * 2 + (0 if strong_to_move else 1)
+
+def stored_squares(name, index):
+    # the other way round, for walking a whole table: (squares, strong side to move)
+    strong_to_move = index % 2 == 0
+    index //= 2
+    squares = []
+    for _ in range(len(ENDGAMES[name]) + 1):
+        index, square = divmod(index, 64)
+        squares.append(square)
+    king = chess.square(index % 4, index // 4) if has_pawns(name) else TRIANGLE[index]
+    return [king] + squares[::-1], strong_to_move
+
+def signature(board):
+    # (table name, strong colour) if this position belongs to one of the endings, otherwise None
+    if board.castling_rights:
+        return None
+    for strong in chess.COLORS:
+        if board.occupied_co[not strong] != board.kings & board.occupied_co[not strong]:
+            continue # the weak side has more than a king
+        name = "K"
+        for piece_type in NAME_ORDER:
+            name += chess.piece_symbol(piece_type).upper() * chess.popcount(board.pieces_mask(piece_type, strong))
+        name += "K"
+        if name in ENDGAMES:
+            return name, strong
+    return None
+
+def board_squares(board, name, strong):
+    # the position as [strong king, *pieces, weak king] with the strong side as white
+    squares = [board.king(strong)]
+    for piece_type in ENDGAMES[name]:
+        squares.append(chess.lsb(board.pieces_mask(piece_type, strong)))
+    squares.append(board.king(not strong))
+    if strong == chess.BLACK:
+        squares = [square ^ 56 for square in squares] # upside down, so black's pawn walks up the board
+    return squares
+
+class Bitbases:
+    # opens each table the first time a position from it comes up. missing tables just never answer
+
+    def __init__(self, directory=BITBASE_DIR):
+        self.directory = directory
+        self.tables = {} # name -> mmap, or None if there's no usable file
+
+    def table(self, name):
+        if name not in self.tables:
+            self.tables[name] = None
+            path = resource_path(os.path.join(self.directory, f"{name}.bin"))
+            if os.path.exists(path) and os.path.getsize(path) == table_size(name):
+                with open(path, "rb") as f:
+                    self.tables[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.tables[name]
+
+    def probe(self, board):
+        # score for the side to move, same scale as the search: MATE - plies when it mates, -(MATE - plies) when it gets mated,
+        # 0 for a draw. None if the position isn't in a table we have
+        found = signature(board)
+        if found is None:
+            return None
+        name, strong = found
+        table = self.table(name)
+        if table is None:
+            return None
+        value = table[stored_index(name, board_squares(board, name, strong), board.turn == strong)]
+        if not value:
+            return 0
+        plies = value - 1
+        return MATE - plies if board.turn == strong else -(MATE - plies)
+
+    def score_moves(self, board):
+        # every legal move scored by what the table says about the position after it, best first.
+        # None unless both this position and everything it leads to can be answered
+        if self.probe(board) is None:
+            return None
+        scratch = board.copy(stack=False) # the caller's board is left alone
+        scored_moves = []
+        for move in scratch.legal_moves:
+            scratch.push(move)
+            score = self.probe(scratch)
+            if score is None and scratch.is_insufficient_material():
+                score = 0 # the weak side took something, or a pawn became a minor piece
+            scratch.pop()
+            if score is None:
+                return None # e.g. promoting into a table that isn't built
+            score = -score
+            if score > 0:
+                score -= 1 # a mate after the move is one ply further away from here
+            elif score < 0:
+                score += 1
+            scored_moves.append((move, score))
+        scored_moves.sort(key=lambda x: x[1], reverse=True)
+        return scored_moves
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
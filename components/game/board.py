@@ -0,0 +1,204 @@
+import chess
+import chess.polyglot
+
+from collections import Counter
+
+from components.game.ends import PositionStatus
+
+ZOBRIST_KEYS = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+HASHER = chess.polyglot.ZobristHasher(ZOBRIST_KEYS)
+
+def piece_key(piece_type, colour, square):
+    # same layout polyglot uses, so hashes line up with chess.polyglot's hash_board
+    return ZOBRIST_KEYS[64 * ((piece_type - 1) * 2 + int(colour)) + square]
+
+STARTING_MATERIAL = {
+    chess.PAWN: 8,
+    chess.KNIGHT: 2,
+    chess.BISHOP: 2,
+    chess.ROOK: 2,
+    chess.QUEEN: 1,
+    chess.KING: 1,
+}
+
+def count_material(board):
+    return {
+        colour: {piece_type: chess.popcount(board.pieces_mask(piece_type, colour)) for piece_type in chess.PIECE_TYPES}
+        for colour in chess.COLORS
+    }
+
+def placement_hash(board):
+    # hash of where the pieces are, nothing else (same thing board_fen() describes)
+    zobrist_hash = 0
+    for colour in chess.COLORS:
+        for square in chess.scan_reversed(board.occupied_co[colour]):
+            zobrist_hash ^= piece_key(board.piece_type_at(square), colour, square)
+    return zobrist_hash
+
+class GameBoard(chess.Board):
+    # a chess.Board that keeps a zobrist-hashed index of every position reached by a pushed move,
+    # so repetition checks are one lookup instead of replaying the whole move stack
+
+    @classmethod
+    def from_board(cls, board):
+        # a game board with the same position and history as a plain chess.Board
+        game_board = cls(board.root().fen(), chess960=board.chess960)
+        for move in board.move_stack:
+            game_board.push(move)
+        return game_board
+
+    def __init__(self, *args, **kwargs):
+        self._placement_hash = None # hash of the current placement, None until someone asks
+        self._hash_stack = []       # placement hash before each move on the stack, for pop()
+        self._seen = Counter()      # placement hash -> how many times we've been there after a move
+        self.version = 0            # goes up on every push/pop/reset, so the ui can tell when to redraw
+        self._material = None       # colour -> piece type -> how many are on the board, None until someone asks
+        self._material_stack = []   # (captured piece type, promotion) for each move on the stack, for pop()
+        self._status = None         # PositionStatus for the current version, None until someone asks
+        super().__init__(*args, **kwargs)
+
+    def clear_stack(self):
+        # called by reset(), set_fen(), set_piece_at() etc. whenever the history goes away
+        super().clear_stack()
+        self.version += 1
+        self._placement_hash = None
+        self._hash_stack = []
+        self._seen = Counter()
+        self._material = None
+        self._material_stack = []
+
+    def placement_hash(self):
+        if self._placement_hash is None:
+            self._placement_hash = placement_hash(self)
+        return self._placement_hash
+
+    def placement_delta(self, move):
+        # what pushing this (pseudo-legal) move would xor into the placement hash, without pushing it
+        if not move:
+            return 0
+
+        piece = self.piece_at(move.from_square)
+        colour = piece.color
+        move = self._to_chess960(move)
+        delta = piece_key(piece.piece_type, colour, move.from_square)
+
+        if piece.piece_type == chess.KING and self.occupied_co[colour] & chess.BB_SQUARES[move.to_square]:
+            # castling, the king "captures" its own rook
+            back_rank = 0 if colour == chess.WHITE else 56
+            a_side = chess.square_file(move.to_square) < chess.square_file(move.from_square)
+            king_to = back_rank + (2 if a_side else 6)
+            rook_to = back_rank + (3 if a_side else 5)
+            delta ^= piece_key(chess.ROOK, colour, move.to_square)
+            delta ^= piece_key(chess.KING, colour, king_to)
+            delta ^= piece_key(chess.ROOK, colour, rook_to)
+            return delta
+
+        captured_type = self.piece_type_at(move.to_square)
+        if captured_type:
+            delta ^= piece_key(captured_type, not colour, move.to_square)
+        elif piece.piece_type == chess.PAWN and move.to_square == self.ep_square and chess.square_file(move.to_square) != chess.square_file(move.from_square):
+            down = -8 if colour == chess.WHITE else 8
+            delta ^= piece_key(chess.PAWN, not colour, self.ep_square + down)
+
+        delta ^= piece_key(move.promotion or piece.piece_type, colour, move.to_square)
+        return delta
+
+    def position_hash(self):
+        # the full polyglot hash (placement, castling, en passant, turn), same as chess.polyglot.zobrist_hash
+        return self.placement_hash() ^ HASHER.hash_castling(self) ^ HASHER.hash_ep_square(self) ^ HASHER.hash_turn(self)
+
+    def seen_positions(self):
+        # every placement hash in the index, enough for another board to answer is_repeat_after the same way
+        return list(self._seen)
+
+    def add_seen_positions(self, hashes):
+        self._seen.update(hashes)
+
+    def material(self):
+        if self._material is None:
+            self._material = count_material(self)
+        return self._material
+
+    def captured_pieces(self):
+        # same shape as captures.get_captured_pieces: colour name -> piece type -> how many of theirs are gone
+        material = self.material()
+        captured = {"white": {}, "black": {}}
+        for colour, name in ((chess.WHITE, "white"), (chess.BLACK, "black")):
+            for piece_type, starting in STARTING_MATERIAL.items():
+                missing = starting - material[colour][piece_type]
+                if missing > 0:
+                    captured[name][piece_type] = missing
+        return captured
+
+    def material_change(self, move):
+        # (piece type this move captures, piece type it promotes to), either can be None
+        if not move:
+            return None, None
+        captured_type = None
+        if self.occupied_co[not self.turn] & chess.BB_SQUARES[move.to_square]:
+            captured_type = self.piece_type_at(move.to_square)
+        elif self.is_en_passant(move):
+            captured_type = chess.PAWN
+        return captured_type, move.promotion
+
+    def position_status(self):
+        # game over/check/legal moves for the current position, worked out once per version instead of every frame
+        if self._status is None or self._status.version != self.version:
+            version = self.version
+            self._status = PositionStatus(self)
+            self.version = version # is_fivefold_repetition() pops and pushes to replay the game, that's not a new position
+        return self._status
+
+    def is_repeat(self):
+        # has the current placement already come up earlier in this game (or the line being searched)?
+        return self._seen.get(self.placement_hash(), 0) > 1
+
+    def is_repeat_after(self, move):
+        # has the position after this move already come up in this game?
+        return (self.placement_hash() ^ self.placement_delta(move)) in self._seen
+
+    def push(self, move):
+        before = self.placement_hash()
+        after = before ^ self.placement_delta(move)
+        colour = self.turn
+        captured_type, promotion = change = self.material_change(move)
+        material = self.material()
+        super().push(move)
+        self.version += 1
+        self._hash_stack.append(before)
+        self._placement_hash = after
+        self._seen[after] += 1
+        self._material_stack.append(change)
+        if captured_type:
+            material[not colour][captured_type] -= 1
+        if promotion:
+            material[colour][chess.PAWN] -= 1
+            material[colour][promotion] += 1
+
+    def pop(self):
+        move = super().pop()
+        self.version += 1
+        colour = self.turn # the side that made the move we just took back
+        captured_type, promotion = self._material_stack.pop()
+        if captured_type:
+            self._material[not colour][captured_type] += 1
+        if promotion:
+            self._material[colour][chess.PAWN] += 1
+            self._material[colour][promotion] -= 1
+        current = self.placement_hash()
+        self._seen[current] -= 1
+        if not self._seen[current]:
+            del self._seen[current]
+        self._placement_hash = self._hash_stack.pop()
+        return move
+
+    def copy(self, *, stack=True):
+        board = super().copy(stack=stack)
+        board._placement_hash = self._placement_hash
+        board._seen = self._seen.copy() # the copy still remembers the whole game, even without a stack
+        if self._material is not None:
+            board._material = {colour: counts.copy() for colour, counts in self._material.items()}
+        if stack:
+            board._hash_stack = self._hash_stack[len(self._hash_stack) - len(board.move_stack):]
+            board._material_stack = self._material_stack[len(self._material_stack) - len(board.move_stack):]
+        return board
@@ -0,0 +1,82 @@
+import os
+import random
+import struct
+import sys
+import chess
+import chess.polyglot
+
+# opening book in the polyglot format: 16 byte records of (position hash, move, weight, learn) sorted by hash.
+# chess.polyglot memory-maps the file and binary searches it, so looking a position up doesn't load the book
+
+BOOK_PATH = "assets/book.bin"
+
+ENTRY_STRUCT = struct.Struct(">QHHI")
+
+def resource_path(relative_path):
+    # same as components.shared.resource_path, without pulling pygame in
+    try:
+        base_path = sys._MEIPASS  # pyinstaller sets this
+    except Exception:
+        base_path = os.path.abspath(".")
+
+    return os.path.join(base_path, relative_path)
+
+class OpeningBook:
+    # opens the book the first time it's asked about a position. a missing book just never has a move
+
+    def __init__(self, path=BOOK_PATH):
+        self.path = path
+        self.reader = None
+        self.missing = False
+
+    def open(self):
+        if self.reader is None and not self.missing:
+            path = resource_path(self.path)
+            if os.path.exists(path):
+                self.reader = chess.polyglot.open_reader(path)
+            else:
+                self.missing = True
+        return self.reader
+
+    def moves(self, board):
+        # (move, weight) for every legal book move in this position
+        reader = self.open()
+        if reader is None:
+            return []
+        return [(entry.move, entry.weight) for entry in reader.find_all(board) if board.is_legal(entry.move)]
+
+    def choose(self, board):
+        # a book move picked at random by weight, or None once we're out of book
+        moves = self.moves(board)
+        if not moves:
+            return None
+        return random.choices([move for move, _ in moves], weights=[weight for _, weight in moves])[0]
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+def encode_move(board, move):
+    # polyglot move bits, castling is written as the king taking its own rook
+    from_square = move.from_square
+    to_square = move.to_square
+    if board.is_castling(move) and not board.chess960:
+        rank = chess.square_rank(from_square)
+        to_square = chess.square(7 if chess.square_file(to_square) > chess.square_file(from_square) else 0, rank)
+    promotion = move.promotion - 1 if move.promotion else 0 # knight is 1 ... queen is 4
+    return (chess.square_file(to_square)
+            | chess.square_rank(to_square) << 3
+            | chess.square_file(from_square) << 6
+            | chess.square_rank(from_square) << 9
+            | promotion << 12)
+
+def write_book(path, weights):
+    # weights is {(position hash, encoded move): weight}, weights are scaled down to fit in 16 bits
+    biggest = max(weights.values(), default=0)
+    scale = 65535 / biggest if biggest > 65535 else 1
+    records = sorted((key, raw_move, max(1, int(weight * scale))) for (key, raw_move), weight in weights.items() if weight > 0)
+    with open(path, "wb") as f:
+        for key, raw_move, weight in records:
+            f.write(ENTRY_STRUCT.pack(key, raw_move, weight, 0))
+    return len(records)
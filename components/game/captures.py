@@ -1,6 +1,9 @@
 import chess
 
 def get_captured_pieces(board):
+    if hasattr(board, "captured_pieces"): # game boards keep count as moves are made
+        return board.captured_pieces()
+
     starting_counts = {
         "white": {
             chess.PAWN: 8,
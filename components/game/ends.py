@@ -1,6 +1,41 @@
 import chess
 
+class PositionStatus:
+    # everything the ui asks about a position every frame, worked out once: whether (and how) the game is over,
+    # whether the side to move is in check, and the legal moves grouped by the square they start from.
+    # GameBoard.position_status() keeps one of these per board version, so it's only rebuilt after a push/pop
+
+    def __init__(self, board):
+        self.version = getattr(board, "version", None)
+        self.moves_by_square = {}
+        for move in board.legal_moves:
+            self.moves_by_square.setdefault(move.from_square, []).append(move)
+        self.is_check = board.is_check()
+        self.game_over, self.result = game_result(board, bool(self.moves_by_square), self.is_check)
+
+    def moves_from(self, square):
+        return list(self.moves_by_square.get(square, []))
+
+def game_result(board, has_moves, is_check):
+    # same answers in the same order as below, without generating the legal moves again
+    if not has_moves:
+        if is_check:
+            winner = "white" if board.turn == chess.BLACK else "black"
+            return True, f"{winner} wins by checkmate"
+        return True, "draw by stalemate"
+    elif board.is_insufficient_material():
+        return True, "draw by insufficient material"
+    elif board.is_seventyfive_moves():
+        return True, "draw by 75-move rule"
+    elif board.is_fivefold_repetition():
+        return True, "draw by fivefold repetition"
+    return False, ""
+
 def get_game_result(board):
+    if hasattr(board, "position_status"):
+        status = board.position_status() # cached until the board changes
+        return status.game_over, status.result
+
     if not board.is_game_over():
         return False, ""
 
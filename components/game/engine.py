@@ -1,8 +1,17 @@
 import chess
+import chess.polyglot
 import copy
 import random
+import time
 
-from components.shared import PIECES_VALUES_INVERSE, PIECES_VALUES
+from collections import OrderedDict
+
+from components.game.values import PIECES_VALUES_INVERSE, PIECES_VALUES
+from components.game.board import GameBoard
+from components.game.search import search
+from components.game.book import OpeningBook
+from components.game.bitbase import Bitbases
+from components.game.see import see, see_square
 
 white_openings = [
     "e4", "d4", "Nf3", "c4", "f4", "b3"
@@ -12,6 +21,98 @@ black_openings = [
     "e5", "c5", "e6", "c6", "d5", "g6", "Nf6"
 ]
 
+class EvalCache:
+    # remembers move scores by (position hash, move, colour), dropping the least recently used once it's full.
+    # only the part of the score that depends on the position alone goes in here, the repetition term
+    # depends on how we got to the position so score_move always works that out fresh
+
+    def __init__(self, maxsize=50000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        score = self.entries.get(key)
+        if score is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return score
+
+    def put(self, key, score):
+        self.entries[key] = score
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False) # least recently used
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class EngineStats:
+    # optional profiling for do_move: how many times each part of the move scoring ran and how long it took.
+    # pass one in as stats=..., everything is skipped when it's None
+
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+        self.last = None
+
+    def start(self):
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        # charge the time since the last start()/lap() to name
+        now = time.perf_counter()
+        self.seconds[name] = self.seconds.get(name, 0.0) + now - self.last
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.last = now
+
+    def merge(self, other):
+        # other can be another EngineStats or its as_dict(), which is what comes back from pool workers
+        if isinstance(other, EngineStats):
+            other = other.as_dict()
+        for name, (calls, seconds) in other.items():
+            self.calls[name] = self.calls.get(name, 0) + calls
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def as_dict(self):
+        return {name: (self.calls[name], self.seconds[name]) for name in self.calls}
+
+    def report(self):
+        total = sum(self.seconds.values()) or 1.0
+        lines = []
+        for name in sorted(self.seconds, key=self.seconds.get, reverse=True):
+            seconds = self.seconds[name]
+            lines.append(f"{name:<20} {self.calls[name]:>8} calls {seconds * 1000:>10.2f}ms {seconds / total * 100:>6.1f}%")
+        return "\n".join(lines)
+
+MOVE_CACHE = EvalCache() # shared by everything in this process unless told otherwise
+
+OPENING_BOOK = OpeningBook() # assets/book.bin, see tools/build_book.py
+
+BITBASES = Bitbases() # assets/bitbases/*.bin, see tools/build_bitbases.py
+
+USE_SEE = False # score captures, promotions and square safety by static exchange instead of the attacker/defender counts
+
+def position_hash(board):
+    if isinstance(board, GameBoard):
+        return board.position_hash()
+    return chess.polyglot.zobrist_hash(board)
+
 def get_legal_moves(board):
     legal_moves = list(board.legal_moves)
     if not legal_moves:
@@ -34,11 +135,21 @@ def get_pieces(board, colour, mode="piece"):
 
     raise ValueError("invalid mode for get_pieces")
 
-def do_move(board):
+def do_move(board, pool=None, cache=MOVE_CACHE, stats=None, book=OPENING_BOOK, movetime=None, nodes=None, depth=None, stop=None, info=None, ponderer=None, bitbases=BITBASES):
+    # pool is an optional parallel.ScoringPool to spread the root moves over several processes,
+    # cache is the EvalCache to score through (None to always score from scratch),
+    # stats is an optional EngineStats to record where the time went,
+    # book is the OpeningBook to play from while it knows the position (None to never use one).
+    # giving any of movetime (seconds), nodes or depth switches to the alpha-beta search instead of scoring one ply,
+    # stop is an optional threading.Event to cut it short and info an optional dict that gets depth/nodes/nps/etc.
+    # ponderer is an optional ponder.Ponderer, if it already searched this position during the opponent's turn that's used instead.
+    # bitbases are the endgame tables to play perfectly from once the material is down to one of them (None to never use them)
     
     legal_moves = get_legal_moves(board)
     if not legal_moves:
         return None
+
+    pondered = ponderer.lookup(board) if ponderer is not None else None # always asked, so the pondering stops
     
     move_number = board.fullmove_number
 
@@ -46,19 +157,40 @@ def do_move(board):
     me = board.turn
     opponent = not me
 
-    if move_number == 1: # first move
-        if me == chess.WHITE:
-            move = board.parse_san(random.choice(white_openings))
-        else:
-            move = board.parse_san(random.choice(black_openings))
-
-        return move, [(move, 0)]
-
-    scored_moves = []
+    if bitbases is not None:
+        scored_moves = bitbases.score_moves(board)
+        if scored_moves:
+            best_score = scored_moves[0][1]
+            move = random.choice([move for move, score in scored_moves if score == best_score]) # equally quick mates
+            return move, scored_moves
+
+    if book is not None:
+        move = book.choose(board)
+        if move is not None:
+            return move, [(move, 0)]
+
+    if move_number == 1 and is_opening_position(board): # first move, if the book didn't have one
+        openings = white_openings if me == chess.WHITE else black_openings
+        opening_moves = [move for move in legal_moves if board.san(move) in openings]
+        if opening_moves:
+            move = random.choice(opening_moves)
+            return move, [(move, 0)]
+
+    if movetime is not None or nodes is not None or depth is not None:
+        result = pondered or search(board, movetime, nodes, depth, stop)
+        if info is not None:
+            info.update({key: value for key, value in result.items() if key != "scored_moves"})
+        return result["move"], result["scored_moves"]
+
+    if pool is not None:
+        scored_moves = list(zip(legal_moves, pool.score(board, legal_moves, me, cache is not None, stats))) # same order as legal_moves, so ties break the same
+    else:
+        scored_moves = []
+        scratch = scratch_copy(board) # one board to push and pop on for the whole search, the real one is left alone
 
-    for move in legal_moves:
-        score = get_move_goodness(board, move, me)
-        scored_moves.append((move, score))
+        for move in legal_moves:
+            score = score_move(scratch, move, me, cache, stats)
+            scored_moves.append((move, score))
 
     scored_moves.sort(key=lambda x: x[1], reverse=True) # sort by score
 
@@ -71,6 +203,21 @@ def do_move(board):
     return move, scored_moves
 
     
+def is_opening_position(board):
+    # the starting position with white to move, or one white move into it with black to move. a game set up from a fen can be on
+    # move 1 too, and the opening lists don't fit it. epd() compares side to move, castling and en passant as well as the pieces
+    start = chess.Board()
+    position = board.epd()
+    if position == start.epd():
+        return True
+    for move in start.legal_moves:
+        start.push(move)
+        reached = start.epd() == position
+        start.pop()
+        if reached:
+            return True
+    return False
+
 def get_position_set(board):
     moves = board.move_stack
     
@@ -84,6 +231,9 @@ def get_position_set(board):
     return positions
 
 def position_is_repeat(board, move):
+    if isinstance(board, GameBoard):
+        return board.is_repeat_after(move) # the board keeps its own index, no need to replay the game
+
     position_set = get_position_set(board)
 
     imaginary_board = board.copy()
@@ -92,86 +242,192 @@ def position_is_repeat(board, move):
 
     return position in position_set # check if the position is in the set
 
-def get_move_goodness(board, move, colour):
-    score = 0
+def get_move_goodness(board, move, colour, cache=MOVE_CACHE):
+    return score_move(scratch_copy(board), move, colour, cache) # never touch the board we were given
 
-    imaginary_board = board.copy()
-    imaginary_board.push(move) # this is a copy of the board after the move is made
+def scratch_copy(board):
+    # a board we're allowed to push and pop on. game boards carry their repetition index without the
+    # move stack, so they don't need it copied; plain boards need it for get_position_set
+    if isinstance(board, GameBoard):
+        return board.copy(stack=False)
+    return board.copy()
+
+def score_move(board, move, colour, cache=None, stats=None):
+    if stats is not None:
+        stats.start()
+
+    score = 0
 
     if position_is_repeat(board, move):
-        score -= 2
-    
+        score -= 2 # depends on the game history, so it's kept out of the cache
+    if stats is not None:
+        stats.lap("repetition")
+
+    if cache is None:
+        return score + score_position_move(board, move, colour, stats)
+
+    key = (position_hash(board), move, colour, USE_SEE)
+    position_score = cache.get(key)
+    if stats is not None:
+        stats.lap("cache")
+    if position_score is None:
+        position_score = score_position_move(board, move, colour, stats)
+        cache.put(key, position_score)
+    return score + position_score
+
+def score_position_move(board, move, colour, stats=None):
+    # everything in the score that only depends on the position and the move.
+    # pushes the move, scores the position and pops it again, so board has to be a scratch copy, not the live board
+    score = 0
 
-    opponent_check, opponent_checkmate, oppponent_stalemate = can_opponent_end_game(imaginary_board, move, colour)
+    moving_piece, captured_piece, exchange = move_facts(board, move)
+
+    board.push(move) # board is now the position after the move is made
+    attack_map = AttackMap(board) # every defence question below is answered from this one scan
+    stalemates = 0 # settled after the pop, do_i_want_stalemate looks at the position before the move
+    if stats is not None:
+        stats.lap("push+attack_map")
+
+    opponent_check, opponent_checkmate, oppponent_stalemate = can_opponent_end_game(board, move, colour)
     if opponent_checkmate:
         score -= 5000 # we lose immediately
     elif opponent_check:
         score -= 5 # not necessarily a disaster but not ideal
     elif oppponent_stalemate:
+        stalemates += 1
+    if stats is not None:
+        stats.lap("opponent_end_game")
+
+    if board.is_checkmate():
+        score += 5000 # we win immediately
+    if board.is_stalemate():
+        stalemates += 1
+
+    score += static_move_terms(board, move, colour, moving_piece, captured_piece, exchange, attack_map, stats)
+
+    board.pop() # back to the position we were given
+
+    if stalemates:
         if do_i_want_stalemate(board, colour):
-            score += 2500 # better than losing
+            score += 2500 * stalemates # better than losing
+        else:
+            score -= 2500 * stalemates # worse than losing
+    if stats is not None:
+        stats.lap("pop+stalemate")
+
+    if moves_into_centre(move):
+        score += 2 # controlling the centre is good
+    if stats is not None:
+        stats.lap("centre")
+
+    return score
+
+def move_facts(board, move):
+    # what static_move_terms needs to know from before the move is made:
+    # (moving piece type, captured piece type or None, what the exchange comes out at if USE_SEE and it's a capture, else None)
+    moving_piece = board.piece_type_at(move.from_square)
+    captured_piece = None
+    exchange = None
+    if board.is_capture(move):
+        if board.is_en_passant(move):
+            captured_piece = chess.PAWN
         else:
-            score -= 2500 # worse than losing
+            captured_piece = board.piece_type_at(move.to_square)
+        if USE_SEE:
+            exchange = see(board, move) # what we come out with once the trades on that square are done
+    return moving_piece, captured_piece, exchange
+
+def static_move_terms(board, move, colour, moving_piece, captured_piece, exchange, attack_map, stats=None):
+    # the terms that need nothing but the position after the move (board, with the move already pushed):
+    # check, promotion, capture, square safety, king move and hanging pieces. batch.score_children does the same in numpy
+    score = 0
+    if USE_SEE:
+        square_loss = see_square(board, move.to_square) # what the opponent wins by starting on the piece we just moved
 
-    if imaginary_board.is_check():
-        if is_piece_adequately_defended(imaginary_board, move.to_square, colour):
+    if board.is_check():
+        if attack_map.is_defended(move.to_square, colour):
             score += 10 # we check the opponent and they can't take the piece
         else:
             score -= 10 # don't give away a piece like an idiot
-    if imaginary_board.is_checkmate():
-        score += 5000 # we win immediately
-    if imaginary_board.is_stalemate():
-        if do_i_want_stalemate(board, colour):
-            score += 2500 # better than losing
-        else:
-            score -= 2500 # worse than losing
+    if stats is not None:
+        stats.lap("our_check")
 
     if move.promotion is not None:
         promoted_piece_type = move.promotion
-        if is_piece_adequately_defended(imaginary_board, move.to_square, colour):
+        if USE_SEE:
+            defended = not square_loss
+        else:
+            defended = attack_map.is_defended(move.to_square, colour)
+        if defended:
             score += PIECES_VALUES[promoted_piece_type] # we gain the piece
         else:
             score -= (PIECES_VALUES[promoted_piece_type] + PIECES_VALUES[chess.PAWN]) # we lose the piece and the pawn in a sense
+    if stats is not None:
+        stats.lap("promotion")
 
-    if board.is_capture(move):
-        if board.is_en_passant(move):
-            captured_piece = chess.PAWN
+    if captured_piece is not None and USE_SEE:
+        if exchange > 0:
+            score += exchange * 4 # winning trades count four times over, like a captured piece does below
         else:
-            captured_piece = board.piece_at(move.to_square).piece_type
-        capturing_piece = board.piece_at(move.from_square).piece_type
+            score += exchange
+    elif captured_piece is not None:
         captured_value = round(PIECES_VALUES[captured_piece] * 4) # we get a piece and the opponent loses a piece
-        capturing_value = PIECES_VALUES[capturing_piece]
+        capturing_value = PIECES_VALUES[moving_piece]
 
         if captured_value > capturing_value:
             score += captured_value - capturing_value
         else:
-            if is_piece_adequately_defended(imaginary_board, move.to_square, colour):
+            if attack_map.is_defended(move.to_square, colour):
                 score += captured_value - capturing_value # we gain a piece
             else:
                 score -= captured_value - capturing_value # we lose a piece
+    if stats is not None:
+        stats.lap("capture")
 
-    if is_piece_adequately_defended(imaginary_board, move.to_square, colour):
+    if USE_SEE:
+        if not square_loss:
+            score += 1 # nothing to gain by taking it
+        else:
+            score -= square_loss # what we'd actually lose there, not the whole piece
+    elif attack_map.is_defended(move.to_square, colour):
         score += 1 # we're moving to a square that is either defended or not attacked
     else:
-        score -= PIECES_VALUES[imaginary_board.piece_at(move.to_square).piece_type] # we're moving to a square that is attacked and not defended
+        score -= PIECES_VALUES[board.piece_type_at(move.to_square)] # we're moving to a square that is attacked and not defended
+    if stats is not None:
+        stats.lap("square_safety")
 
-    if board.piece_at(move.from_square).piece_type == chess.KING:
-        if imaginary_board.is_castling(move):
+    if moving_piece == chess.KING:
+        if board.is_castling(move):
             score += 2 # castling is good
         else:
             score -= 10 # don't move the king around like an idiot
+    if stats is not None:
+        stats.lap("king_move")
 
-    score -= value_of_pieces_hanging(imaginary_board, colour) # any pieces we hang we might as well be losing
-    score += value_of_opponent_pieces_hanging(imaginary_board, colour) // 2 # any pieces they hang we might as well be gaining
+    score -= value_of_pieces_hanging(board, colour, attack_map) # any pieces we hang we might as well be losing
+    score += value_of_opponent_pieces_hanging(board, colour, attack_map) // 2 # any pieces they hang we might as well be gaining
     # i'm halving this because it seems to incentivise just leaving the opponent's pieces hanging and not taking them
     # (if they take the piece, there is less pieces hanging, so the score is lower)
+    if stats is not None:
+        stats.lap("hanging")
 
-    if moves_into_centre(move):
-        score += 2 # controlling the centre is good
+    return score
 
+def static_move_score(board, move, colour):
+    # static_move_terms plus the centre bonus for one move, pushing and popping on board (a scratch copy).
+    # what batch.score_children gives for every move at once
+    moving_piece, captured_piece, exchange = move_facts(board, move)
+    board.push(move)
+    score = static_move_terms(board, move, colour, moving_piece, captured_piece, exchange, AttackMap(board))
+    board.pop()
+    if moves_into_centre(move):
+        score += 2
     return score
 
-def value_of_pieces_hanging(board, colour):
+def value_of_pieces_hanging(board, colour, attack_map=None):
+    if attack_map is not None:
+        return attack_map.hanging_value(colour)
+
     my_squares = get_pieces(board, colour, mode="square")
 
     value_hanging = 0
@@ -180,8 +436,8 @@ def value_of_pieces_hanging(board, colour):
             value_hanging += PIECES_VALUES[board.piece_at(square).piece_type]
     return value_hanging
 
-def value_of_opponent_pieces_hanging(board, colour):
-    return value_of_pieces_hanging(board, not colour)
+def value_of_opponent_pieces_hanging(board, colour, attack_map=None):
+    return value_of_pieces_hanging(board, not colour, attack_map)
 
 def moves_into_centre(move):
     from_square = move.from_square
@@ -197,7 +453,10 @@ def moves_into_centre(move):
     return False
 
 def do_i_want_stalemate(board, colour):
-    my_pieces = get_pieces(board, colour, "type") # get all the piece types i have
+    if isinstance(board, GameBoard):
+        my_pieces = [piece_type for piece_type, count in board.material()[colour].items() if count] # the board keeps count already
+    else:
+        my_pieces = get_pieces(board, colour, "type") # get all the piece types i have
 
     i_have_queen = any(piece == chess.QUEEN for piece in my_pieces)
     i_have_rook = any(piece == chess.ROOK for piece in my_pieces)
@@ -210,22 +469,29 @@ def do_i_want_stalemate(board, colour):
         return True
 
 def can_opponent_end_game(imaginary_board, move, colour): 
+    # pushes and pops each reply on imaginary_board, it's left as it was when this returns
     legal_moves = get_legal_moves(imaginary_board)
     if not legal_moves:
         return False, False, False
     
     for opponent_move in legal_moves:
-        double_imaginary_board = imaginary_board.copy() # we're two moves deep now
-        double_imaginary_board.push(opponent_move)
-        if double_imaginary_board.is_checkmate():
+        imaginary_board.push(opponent_move) # we're two moves deep now
+        checkmate = imaginary_board.is_checkmate()
+        check = checkmate or imaginary_board.is_check()
+        stalemate = not check and imaginary_board.is_stalemate()
+        imaginary_board.pop()
+        if checkmate:
             return True, True, False
-        if double_imaginary_board.is_check():
+        if check:
             return True, False, False
-        if double_imaginary_board.is_stalemate():
+        if stalemate:
             return False, False, True
     return False, False, False
 
-def is_piece_adequately_defended(board, square, colour):
+def is_piece_adequately_defended(board, square, colour, attack_map=None):
+    if attack_map is not None:
+        return attack_map.is_defended(square, colour)
+
     piece = board.piece_at(square)
     if not piece:
         return False
@@ -261,8 +527,53 @@ def is_piece_adequately_defended(board, square, colour):
     else:
         return True
 
-    
-
-    
-
-    
+class AttackMap:
+    # who attacks every occupied square of one position, worked out in a single pass over the pieces
+    # so the defence and hanging-piece heuristics don't each call board.attackers() again
+
+    def __init__(self, board):
+        self.board = board
+        self.attacker_score = {chess.WHITE: {}, chess.BLACK: {}} # square -> summed PIECES_VALUES_INVERSE of that colour's attackers
+        self.cheapest_attacker = {chess.WHITE: {}, chess.BLACK: {}} # square -> lowest PIECES_VALUES of that colour's attackers
+        self.defended = {}
+        self.hanging = {}
+
+        occupied = board.occupied
+        for colour in chess.COLORS:
+            scores = self.attacker_score[colour]
+            cheapest = self.cheapest_attacker[colour]
+            for square in chess.scan_reversed(board.occupied_co[colour]):
+                piece_type = board.piece_type_at(square)
+                inverse_value = PIECES_VALUES_INVERSE[piece_type]
+                value = PIECES_VALUES[piece_type]
+                for target in chess.scan_reversed(board.attacks_mask(square) & occupied): # only occupied squares ever get asked about
+                    scores[target] = scores.get(target, 0) + inverse_value
+                    if value < cheapest.get(target, value + 1):
+                        cheapest[target] = value
+
+    def is_defended(self, square, colour):
+        # same answer as is_piece_adequately_defended(board, square, colour), just cached
+        key = (square, colour)
+        if key not in self.defended:
+            piece_type = self.board.piece_type_at(square)
+            if not piece_type:
+                self.defended[key] = False
+            else:
+                piece_value = PIECES_VALUES[piece_type]
+                cheapest = self.cheapest_attacker[not colour].get(square)
+                if cheapest is not None and cheapest < piece_value:
+                    self.defended[key] = False # attacked by something cheaper
+                else:
+                    attacker_score = self.attacker_score[not colour].get(square, 0)
+                    defender_score = self.attacker_score[colour].get(square, 0)
+                    self.defended[key] = attacker_score <= defender_score
+        return self.defended[key]
+
+    def hanging_value(self, colour):
+        if colour not in self.hanging:
+            value_hanging = 0
+            for square in chess.scan_reversed(self.board.occupied_co[colour]):
+                if not self.is_defended(square, colour):
+                    value_hanging += PIECES_VALUES[self.board.piece_type_at(square)]
+            self.hanging[colour] = value_hanging
+        return self.hanging[colour]
@@ -0,0 +1,55 @@
+import os
+import chess
+
+from concurrent.futures import ProcessPoolExecutor
+
+from components.game.board import GameBoard
+from components.game import engine
+from components.game.engine import score_move, MOVE_CACHE, EngineStats
+
+def score_chunk(fen, seen_positions, move_ucis, colour, use_cache, profile, use_see):
+    # runs in a worker process, rebuilds the position (and what it needs of the history) from plain data
+    engine.USE_SEE = use_see # the worker only has whatever the flag was when it started, so take the caller's
+    board = GameBoard(fen)
+    board.add_seen_positions(seen_positions)
+    cache = MOVE_CACHE if use_cache else None # each worker process has its own
+    stats = EngineStats() if profile else None
+    scores = [score_move(board, chess.Move.from_uci(uci), colour, cache, stats) for uci in move_ucis]
+    return scores, stats.as_dict() if profile else None
+
+class ScoringPool:
+    # scores root moves across several processes. pass one to do_move(board, pool=...);
+    # the processes are started on first use and kept around for every call after that
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+
+    def score(self, board, moves, colour, use_cache=True, stats=None):
+        # scores for moves, in the same order as moves
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        if not isinstance(board, GameBoard): # plain boards need their history replayed to know what's a repeat
+            board = GameBoard.from_board(board)
+
+        fen = board.fen()
+        seen_positions = board.seen_positions()
+        chunks = [moves[i::self.workers] for i in range(self.workers)] # dealt out like cards so every worker gets a mix
+        futures = [
+            self.executor.submit(score_chunk, fen, seen_positions, [move.uci() for move in chunk], colour, use_cache, stats is not None, engine.USE_SEE)
+            for chunk in chunks if chunk
+        ]
+
+        scores = [None] * len(moves)
+        for i, future in enumerate(futures):
+            chunk_scores, chunk_stats = future.result()
+            scores[i::self.workers] = chunk_scores
+            if stats is not None:
+                stats.merge(chunk_stats)
+        return scores
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,86 @@
+import threading
+import traceback
+
+from components.game.engine import position_hash
+from components.game.search import search
+
+PONDER_REPLIES = 3   # how many of the opponent's likely replies to think about
+PONDER_TIME = 3.0    # seconds of search per reply, about what the engine would get on its own turn
+PREDICT_DEPTH = 2    # how deep to look when guessing the replies
+
+class Ponderer:
+    # thinks on the opponent's time. start() is called right after the engine moves, and searches the
+    # positions after the likeliest replies on a background thread. lookup() is called once the reply
+    # has actually been played: if it was one we pondered the result is ready, otherwise the work is dropped
+
+    def __init__(self, replies=PONDER_REPLIES, movetime=PONDER_TIME):
+        self.replies = replies
+        self.movetime = movetime
+        self.thread = None
+        self.stop_event = None
+        self.results = None # position hash after a reply -> search result, for the current ponder
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+
+    def start(self, board):
+        self.stop()
+        snapshot = board.copy() # the live board keeps changing, the thread only ever sees this
+        self.stop_event = threading.Event()
+        self.results = {}
+        self.thread = threading.Thread(target=self.run, args=(snapshot, self.stop_event, self.results), daemon=True)
+        self.thread.start()
+
+    def run(self, board, stop, results):
+        try:
+            guess = search(board, depth=PREDICT_DEPTH, stop=stop)
+            if guess is None:
+                return # game over, nothing to reply to
+            for move, _ in guess["scored_moves"][:self.replies]:
+                if stop.is_set():
+                    return
+                board.push(move)
+                result = search(board, movetime=self.movetime, stop=stop)
+                if result is not None and not stop.is_set():
+                    results[position_hash(board)] = result # only keep searches that got their full time
+                board.pop()
+        except Exception as e:
+            print(f"error while pondering: {e}")
+            traceback.print_exc()
+
+    def stop(self):
+        if self.stop_event is not None:
+            self.stop_event.set()
+            self.thread.join(1.0) # it notices within a few thousand nodes
+        self.thread = None
+        self.stop_event = None
+        self.results = None
+
+    def lookup(self, board):
+        # the pondered search for this position, or None. either way the ponder is over after this
+        if self.results is None:
+            return None # weren't pondering
+        results = self.results
+        self.stop()
+        result = results.get(position_hash(board))
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.time_saved += result["seconds"]
+        return result
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "time_saved": self.time_saved,
+        }
+
+    def report(self):
+        return f"ponder hits {self.hits}/{self.hits + self.misses} ({self.hit_rate() * 100:.1f}%), {self.time_saved:.2f}s saved"
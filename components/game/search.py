@@ -0,0 +1,186 @@
+import time
+import chess
+
+from components.game.board import GameBoard
+from components.game.values import PIECES_VALUES
+
+# iterative deepening negamax with alpha-beta, for when the engine has time to think properly.
+# scores are in hundredths of PIECES_VALUES, from the point of view of the side to move
+
+MATE = 1000000
+MAX_DEPTH = 64
+CHECK_EVERY = 1024 # nodes between looking at the clock
+
+CENTRE = chess.BB_D4 | chess.BB_E4 | chess.BB_D5 | chess.BB_E5
+
+PAWN_RANK_BONUS = [0, 0, 0, 0, 5, 15, 30, 0] # by rank from the pawn's own side, so passed pawns get pushed in endings
+
+class SearchAborted(Exception):
+    pass
+
+def evaluate(board):
+    material = board.material()
+    score = 0
+    for colour in chess.COLORS:
+        side = 0
+        for piece_type, count in material[colour].items():
+            side += count * PIECES_VALUES[piece_type] * 100
+        side += chess.popcount(board.occupied_co[colour] & CENTRE) * 10 # controlling the centre is good
+        for square in chess.scan_reversed(board.pawns & board.occupied_co[colour]):
+            rank = chess.square_rank(square)
+            side += PAWN_RANK_BONUS[rank if colour == chess.WHITE else 7 - rank]
+        score += side if colour == chess.WHITE else -side
+    return score if board.turn == chess.WHITE else -score
+
+def move_order_key(board, move, best_move):
+    if move == best_move:
+        return 1000000 # whatever was best last time goes first
+    key = 0
+    if move.promotion:
+        key += PIECES_VALUES[move.promotion] * 100
+    if board.is_capture(move):
+        victim = chess.PAWN if board.is_en_passant(move) else board.piece_type_at(move.to_square)
+        key += 10000 + PIECES_VALUES[victim] * 100 - PIECES_VALUES[board.piece_type_at(move.from_square)] # most valuable victim, least valuable attacker
+    return key
+
+class Search:
+    # one search of one position. the board is pushed to and popped from as it goes, so it has to be a scratch copy
+
+    def __init__(self, board, movetime=None, nodes=None, depth=None, stop=None):
+        self.board = board
+        self.started = time.monotonic()
+        self.deadline = self.started + movetime if movetime is not None else None
+        self.max_nodes = nodes
+        self.max_depth = depth or MAX_DEPTH
+        self.stop = stop # anything with is_set(), like a threading.Event
+        self.nodes = 0
+        self.best_moves = {} # position hash -> best move found there, for move ordering
+
+    def check(self):
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SearchAborted()
+        if self.nodes % CHECK_EVERY == 0:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                raise SearchAborted()
+            if self.stop is not None and self.stop.is_set():
+                raise SearchAborted()
+
+    def ordered_moves(self, moves):
+        best_move = self.best_moves.get(self.board.position_hash())
+        return sorted(moves, key=lambda move: move_order_key(self.board, move, best_move), reverse=True)
+
+    def run(self):
+        board = self.board
+        root_moves = self.ordered_moves(list(board.legal_moves))
+        if not root_moves:
+            return None
+
+        scored_moves = [(move, 0) for move in root_moves] # if not even depth 1 finishes, go with move ordering
+        completed_depth = 0
+        for depth in range(1, self.max_depth + 1):
+            if self.stop is not None and self.stop.is_set():
+                break
+            depth_started = time.monotonic()
+            try:
+                scored = self.search_root(root_moves, depth)
+            except SearchAborted:
+                break
+            scored_moves = scored
+            completed_depth = depth
+            root_moves = [move for move, _ in scored_moves] # best first next time round
+
+            if abs(scored_moves[0][1]) >= MATE - MAX_DEPTH:
+                break # found a mate (or can't avoid one), deeper won't change it
+            if len(root_moves) == 1:
+                break # nothing to think about
+            if self.deadline is not None:
+                now = time.monotonic()
+                if (now - depth_started) * 4 > self.deadline - now:
+                    break # the next depth won't finish in time, don't start it
+
+        seconds = time.monotonic() - self.started
+        return {
+            "move": scored_moves[0][0],
+            "scored_moves": scored_moves,
+            "score": scored_moves[0][1],
+            "depth": completed_depth,
+            "nodes": self.nodes,
+            "seconds": seconds,
+            "nps": int(self.nodes / seconds) if seconds > 0 else 0,
+        }
+
+    def search_root(self, moves, depth):
+        board = self.board
+        alpha = -MATE - 1
+        scored = []
+        for move in moves:
+            board.push(move)
+            score = -self.negamax(depth - 1, -MATE - 1, -alpha, 1)
+            board.pop()
+            scored.append((move, score)) # exact for the best move, an upper bound for the rest
+            if score > alpha:
+                alpha = score
+        scored.sort(key=lambda x: x[1], reverse=True) # stable, so equal scores keep their order
+        self.best_moves[board.position_hash()] = scored[0][0]
+        return scored
+
+    def negamax(self, depth, alpha, beta, ply):
+        self.check()
+        board = self.board
+
+        if board.is_repeat() or board.is_insufficient_material() or board.halfmove_clock >= 150:
+            return 0 # draw
+
+        if depth <= 0:
+            return self.quiesce(alpha, beta, ply)
+
+        moves = list(board.legal_moves)
+        if not moves:
+            return -(MATE - ply) if board.is_check() else 0 # mated, or stalemate
+
+        position_hash = board.position_hash()
+        best_move = None
+        for move in self.ordered_moves(moves):
+            board.push(move)
+            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            board.pop()
+            if score >= beta:
+                self.best_moves[position_hash] = move
+                return score
+            if score > alpha:
+                alpha = score
+                best_move = move
+        if best_move is not None:
+            self.best_moves[position_hash] = best_move
+        return alpha
+
+    def quiesce(self, alpha, beta, ply):
+        # only captures from here on, so we don't stop counting halfway through an exchange
+        self.check()
+        board = self.board
+
+        stand_pat = evaluate(board)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        for move in self.ordered_moves(board.generate_legal_captures()):
+            board.push(move)
+            score = -self.quiesce(-beta, -alpha, ply + 1)
+            board.pop()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+def search(board, movetime=None, nodes=None, depth=None, stop=None):
+    # best move from the last depth that finished within the budget, plus how far it got.
+    # with no budget at all it would search to MAX_DEPTH, so give it at least one
+    if isinstance(board, GameBoard):
+        scratch = board.copy(stack=False) # the repetition index comes along without the stack
+    else:
+        scratch = GameBoard.from_board(board)
+    return Search(scratch, movetime, nodes, depth, stop).run()
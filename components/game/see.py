@@ -0,0 +1,137 @@
+import chess
+
+from components.game.values import PIECES_VALUES
+
+# static exchange evaluation: play out every capture on one square, cheapest piece first, letting either side stop
+# whenever carrying on would lose more, and see what material is left over. works on bitboards only, no pushing.
+# sliders lined up behind each other (x-rays) join in as the pieces in front are used up, pinned pieces stay out
+
+SWAP_ORDER = sorted(chess.PIECE_TYPES, key=lambda piece_type: (piece_type == chess.KING, PIECES_VALUES[piece_type])) # cheapest first, the king last
+
+def pinned_away(board, square, occupied):
+    # pieces pinned to their own king along a line that doesn't go through square, so they can't join in there.
+    # occupied is the board once the first capture has been made, which can uncover a pin of its own
+    pinned = 0
+    for colour in chess.COLORS:
+        king = board.king(colour)
+        if king is None:
+            continue
+        snipers = ((chess.BB_RANK_ATTACKS[king][0] | chess.BB_FILE_ATTACKS[king][0]) & (board.rooks | board.queens)
+                   | chess.BB_DIAG_ATTACKS[king][0] & (board.bishops | board.queens)) & board.occupied_co[not colour] & occupied
+        for sniper in chess.scan_reversed(snipers):
+            between = chess.between(king, sniper) & occupied
+            if between and not between & (between - 1) and between & board.occupied_co[colour]:
+                if not chess.BB_RAYS[king][sniper] & chess.BB_SQUARES[square]:
+                    pinned |= between
+    return pinned
+
+def attackers_to(board, square, occupied):
+    return (board.attackers_mask(chess.WHITE, square, occupied) | board.attackers_mask(chess.BLACK, square, occupied)) & occupied
+
+def xrays(board, square, occupied):
+    # sliders that see square now that something in front of them has gone
+    diagonal = chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied] & (board.bishops | board.queens)
+    straight = (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied]
+                | chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied]) & (board.rooks | board.queens)
+    return (diagonal | straight) & occupied
+
+def least_valuable(board, attackers):
+    # (square, piece type) of the cheapest piece in attackers, attackers isn't empty
+    for piece_type in SWAP_ORDER:
+        pieces = attackers & board.pieces_mask(piece_type, chess.WHITE) | attackers & board.pieces_mask(piece_type, chess.BLACK)
+        if pieces:
+            return chess.lsb(pieces), piece_type
+
+def exchange(board, square, colour, on_square, occupied):
+    # colour is next to capture on square, where a piece worth on_square now stands. returns what colour gains from
+    # the rest of the exchange, never less than 0 because it can always decline to start
+    gains = []
+    pinned = pinned_away(board, square, occupied | chess.BB_SQUARES[square]) # these still block lines, they just never take
+    attackers = attackers_to(board, square, occupied) & ~pinned
+    while True:
+        mine = attackers & board.occupied_co[colour]
+        if not mine:
+            break
+        from_square, piece_type = least_valuable(board, mine)
+        if piece_type == chess.KING and attackers & occupied & board.occupied_co[not colour] & ~chess.BB_SQUARES[from_square]:
+            break # the king can't take into check
+        gains.append(on_square)
+        on_square = PIECES_VALUES[piece_type]
+        occupied &= ~chess.BB_SQUARES[from_square]
+        attackers = (attackers | xrays(board, square, occupied)) & occupied & ~pinned
+        colour = not colour
+
+    # each side only carries on with the exchange if it doesn't leave them worse off than stopping
+    result = 0
+    for gain in reversed(gains):
+        result = max(0, gain - result)
+    return result
+
+def captured_value(board, move):
+    if board.is_en_passant(move):
+        return PIECES_VALUES[chess.PAWN]
+    piece_type = board.piece_type_at(move.to_square)
+    return PIECES_VALUES[piece_type] if piece_type else 0
+
+def see(board, move):
+    # material the side to move comes out ahead by after playing move and the exchange that follows on its square
+    from_square = move.from_square
+    to_square = move.to_square
+    gain = captured_value(board, move)
+    on_square = PIECES_VALUES[board.piece_type_at(from_square)]
+    if move.promotion:
+        gain += PIECES_VALUES[move.promotion] - PIECES_VALUES[chess.PAWN]
+        on_square = PIECES_VALUES[move.promotion]
+
+    occupied = board.occupied & ~chess.BB_SQUARES[from_square] & ~chess.BB_SQUARES[to_square]
+    if board.is_en_passant(move):
+        occupied &= ~chess.BB_SQUARES[to_square + (-8 if board.turn == chess.WHITE else 8)]
+    return gain - exchange(board, to_square, not board.turn, on_square, occupied)
+
+def see_ge(board, move, threshold=0):
+    # see(board, move) >= threshold, but gives up on the exchange as soon as the answer is known
+    from_square = move.from_square
+    to_square = move.to_square
+    swap = captured_value(board, move) - threshold
+    on_square = PIECES_VALUES[board.piece_type_at(from_square)]
+    if move.promotion:
+        swap += PIECES_VALUES[move.promotion] - PIECES_VALUES[chess.PAWN]
+        on_square = PIECES_VALUES[move.promotion]
+    if swap < 0:
+        return False # even keeping the capture for free isn't enough
+    swap = on_square - swap
+    if swap <= 0:
+        return True # even losing the piece we moved is fine
+
+    occupied = board.occupied & ~chess.BB_SQUARES[from_square] & ~chess.BB_SQUARES[to_square]
+    if board.is_en_passant(move):
+        occupied &= ~chess.BB_SQUARES[to_square + (-8 if board.turn == chess.WHITE else 8)]
+    pinned = pinned_away(board, to_square, occupied | chess.BB_SQUARES[to_square]) # the piece we moved is standing there now
+    attackers = attackers_to(board, to_square, occupied) & ~pinned
+
+    colour = board.turn
+    result = True
+    while True:
+        colour = not colour
+        attackers &= occupied
+        mine = attackers & board.occupied_co[colour]
+        if not mine:
+            break
+        result = not result
+        from_square, piece_type = least_valuable(board, mine)
+        if piece_type == chess.KING:
+            # the king only gets to take if nothing can take it back
+            return not result if attackers & board.occupied_co[not colour] else result
+        swap = PIECES_VALUES[piece_type] - swap
+        if swap < int(result):
+            break
+        occupied &= ~chess.BB_SQUARES[from_square]
+        attackers |= xrays(board, to_square, occupied) & ~pinned
+    return result
+
+def see_square(board, square):
+    # what the side to move would win by starting an exchange on square (0 if it can't win anything there)
+    piece_type = board.piece_type_at(square)
+    if not piece_type or not board.occupied_co[not board.turn] & chess.BB_SQUARES[square]:
+        return 0
+    return exchange(board, square, board.turn, PIECES_VALUES[piece_type], board.occupied)
@@ -0,0 +1,21 @@
+import chess
+
+# evaluation constants, kept away from components.shared so the engine can be imported without pygame
+
+PIECES_VALUES = { # adjusted values for ai evaluation
+    chess.PAWN: 1,
+    chess.KNIGHT: 3,
+    chess.BISHOP: 3,
+    chess.ROOK: 10,
+    chess.QUEEN: 15,
+    chess.KING: 0,
+}
+
+PIECES_VALUES_INVERSE = {
+    chess.PAWN: 9,
+    chess.KNIGHT: 4,
+    chess.BISHOP: 4,
+    chess.ROOK: 2,
+    chess.QUEEN: 1,
+    chess.KING: 0,
+}
@@ -0,0 +1,62 @@
+import threading
+import traceback
+
+from concurrent.futures import Future
+
+from components.game.engine import do_move
+
+class EngineWorker:
+    # runs the engine on a background thread so the ui keeps going while it thinks.
+    # start() hands it a snapshot of the board, poll() is called every frame and gives back
+    # the result once it's ready, cancel() stops the search and throws away whatever it was working on.
+    # on_done is called from the worker thread when a think finishes, e.g. to wake up a sleeping ui loop
+
+    def __init__(self, function=do_move, on_done=None):
+        self.function = function
+        self.on_done = on_done
+        self.future = None
+        self.ply = None # length of the move stack the current think started from
+        self.stop_event = None # set to make the current think give up, function has to take stop= like do_move
+
+    def start(self, board, *args, **kwargs):
+        self.cancel()
+        snapshot = board.copy() # the worker only ever sees its own copy, never the live board
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self.stop_event = threading.Event()
+        kwargs["stop"] = self.stop_event
+        thread = threading.Thread(target=self.run, args=(future, snapshot, args, kwargs), daemon=True)
+        self.future = future
+        self.ply = len(board.move_stack)
+        thread.start()
+
+    def run(self, future, snapshot, args, kwargs):
+        try:
+            future.set_result(self.function(snapshot, *args, **kwargs))
+        except Exception as e:
+            print(f"error while the engine was thinking: {e}")
+            traceback.print_exc()
+            future.set_exception(e)
+        if self.on_done is not None:
+            self.on_done()
+
+    def busy(self):
+        return self.future is not None
+
+    def poll(self, board):
+        # the result of the current think if it's finished and still for this position, otherwise None
+        if self.future is None or not self.future.done():
+            return None
+        future = self.future
+        self.future = None
+        if future.exception() is not None or len(board.move_stack) != self.ply:
+            return None # the board moved on without us
+        return future.result()
+
+    def cancel(self):
+        # a thread can't be killed, so a stale think is told to stop and its result is dropped
+        if self.stop_event is not None:
+            self.stop_event.set()
+            self.stop_event = None
+        self.future = None
+        self.ply = None
@@ -1,9 +1,57 @@
 import pygame
 import chess
 
-from components.shared import PIECE_IMAGES, FLIP_BOARD
+from components.shared import get_piece_image, FLIP_BOARD
 from components.mouse import get_mouse_square
 from components.game.captures import get_captured_pieces
+from components.text import get_text_surface
+
+class SpriteAtlas:
+    # piece images scaled once per size and converted to the display's pixel format,
+    # so drawing a piece is just a blit. set_size() switches sizes without reloading the pngs
+
+    def __init__(self, size):
+        self.size = size
+        self.sprites = {} # size -> {(piece_type, colour): surface}
+
+    def set_size(self, size):
+        self.size = size
+
+    def get(self, piece_type, colour):
+        sprites = self.sprites.setdefault(self.size, {})
+        key = (piece_type, colour)
+        if key not in sprites:
+            sprite = pygame.transform.scale(get_piece_image(piece_type, colour), (self.size, self.size))
+            if pygame.display.get_surface() is not None: # convert_alpha needs a display to convert to
+                sprite = sprite.convert_alpha()
+            sprites[key] = sprite
+        return sprites[key]
+
+PIECE_SPRITES = SpriteAtlas(48)
+
+class DirtyRegions:
+    # remembers what each region of the screen was last drawn from. dirty() takes the current
+    # inputs for every region and returns the rects that need redrawing and sending to the display,
+    # which is an empty list when nothing changed
+
+    def __init__(self, screen, regions):
+        self.screen = screen
+        self.regions = regions # name -> pygame.Rect
+        self.keys = {}
+        self.everything = True
+
+    def invalidate(self):
+        self.everything = True
+
+    def dirty(self, keys):
+        if self.everything:
+            self.everything = False
+            self.keys = dict(keys)
+            return [self.screen.get_rect()]
+
+        rects = [self.regions[name] for name, key in keys.items() if self.keys.get(name) != key]
+        self.keys.update(keys)
+        return rects
 
 def render_board_bg(surface, flip):
     board_surf = pygame.Surface((8,8))
@@ -22,8 +70,7 @@ def render_piece(surface, board, square, flip):
     if piece is None:
         return surface
     color = "white" if piece.color == chess.WHITE else "black"
-    piece_image = PIECE_IMAGES[piece.piece_type][color]
-    piece_image = pygame.transform.scale(piece_image, (48, 48))
+    piece_image = PIECE_SPRITES.get(piece.piece_type, color)
 
     
     file, rank = chess.square_file(square), chess.square_rank(square)
@@ -74,13 +121,21 @@ def render_piece_strip(pieces, colour):
     pieces_amount = len(pieces)
     surface = pygame.Surface((pieces_amount * 50, 50), pygame.SRCALPHA)
     for i, piece in enumerate(pieces):
-        piece_image = PIECE_IMAGES[piece][colour].convert_alpha()
-        piece_image = pygame.transform.scale(piece_image, (48, 48))
+        piece_image = PIECE_SPRITES.get(piece, colour)
         surface.blit(piece_image, (i * 40, 0))
     return surface
 
+CAPTURED_STRIPS = {} # (captured counts, flip) -> the two strip surfaces, only the latest is kept
+
 def get_captured_surfaces(board, flip):
     captured_pieces = get_captured_pieces(board)
+    key = (tuple(sorted(captured_pieces["white"].items())), tuple(sorted(captured_pieces["black"].items())), flip)
+    if key not in CAPTURED_STRIPS: # most moves don't capture anything, so the last strips are usually still right
+        CAPTURED_STRIPS.clear()
+        CAPTURED_STRIPS[key] = build_captured_surfaces(captured_pieces, flip)
+    return CAPTURED_STRIPS[key]
+
+def build_captured_surfaces(captured_pieces, flip):
     white_pieces = []
     black_pieces = []
     for piece_type, count in captured_pieces["white"].items():
@@ -97,6 +152,6 @@ def get_captured_surfaces(board, flip):
     return white_surface, black_surface
 
 def render_text(surface, font, text, pos):
-    text_surface = font.render(text, True, (255, 255, 255))
+    text_surface = get_text_surface(font, text, (255, 255, 255))
     surface.blit(text_surface, pos)
     return surface
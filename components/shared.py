@@ -3,7 +3,10 @@ import pygame
 import os
 import sys
 
-BOARD = chess.Board()
+from components.game.board import GameBoard
+from components.game.values import PIECES_VALUES, PIECES_VALUES_INVERSE # still importable from here for older code
+
+BOARD = GameBoard()
 
 
 VERSION = "i1.2.1"
@@ -17,50 +20,22 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
-PIECE_IMAGES = {
-    chess.PAWN: {
-        "white": pygame.image.load(resource_path("assets/pieces/w_pawn.png")),
-        "black": pygame.image.load(resource_path("assets/pieces/b_pawn.png")),
-    },
-    chess.KNIGHT: {
-        "white": pygame.image.load(resource_path("assets/pieces/w_knight.png")),
-        "black": pygame.image.load(resource_path("assets/pieces/b_knight.png")),
-    },
-    chess.BISHOP: {
-        "white": pygame.image.load(resource_path("assets/pieces/w_bishop.png")),
-        "black": pygame.image.load(resource_path("assets/pieces/b_bishop.png")),
-    },
-    chess.ROOK: {
-        "white": pygame.image.load(resource_path("assets/pieces/w_rook.png")),
-        "black": pygame.image.load(resource_path("assets/pieces/b_rook.png")),
-    },
-    chess.QUEEN: {
-        "white": pygame.image.load(resource_path("assets/pieces/w_queen.png")),
-        "black": pygame.image.load(resource_path("assets/pieces/b_queen.png")),
-    },
-    chess.KING: {
-        "white": pygame.image.load(resource_path("assets/pieces/w_king.png")),
-        "black": pygame.image.load(resource_path("assets/pieces/b_king.png")),
-    },
+PIECE_FILES = {
+    chess.PAWN: "pawn",
+    chess.KNIGHT: "knight",
+    chess.BISHOP: "bishop",
+    chess.ROOK: "rook",
+    chess.QUEEN: "queen",
+    chess.KING: "king",
 }
 
-PIECES_VALUES = { # adjusted values for ai evaluation
-    chess.PAWN: 1,
-    chess.KNIGHT: 3,
-    chess.BISHOP: 3,
-    chess.ROOK: 10,
-    chess.QUEEN: 15,
-    chess.KING: 0,
-}
+PIECE_IMAGES = {} # filled in by get_piece_image the first time each piece is drawn
 
-PIECES_VALUES_INVERSE = {
-    chess.PAWN: 9,
-    chess.KNIGHT: 4,
-    chess.BISHOP: 4,
-    chess.ROOK: 2,
-    chess.QUEEN: 1,
-    chess.KING: 0,
-}
+def get_piece_image(piece_type, colour):
+    key = (piece_type, colour)
+    if key not in PIECE_IMAGES:
+        PIECE_IMAGES[key] = pygame.image.load(resource_path(f"assets/pieces/{colour[0]}_{PIECE_FILES[piece_type]}.png"))
+    return PIECE_IMAGES[key]
 
 SCREEN_MODE = "menu"
 
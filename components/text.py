@@ -0,0 +1,18 @@
+from collections import OrderedDict
+
+TEXT_CACHE_SIZE = 256
+
+TEXT_CACHE = OrderedDict() # (font, text, colour, antialias) -> surface, least recently used first
+
+def get_text_surface(font, text, colour, antialias=True):
+    # font.render is slow and most text on screen is the same every frame, so keep what we've rendered
+    key = (font, text, tuple(colour), antialias)
+    surface = TEXT_CACHE.get(key)
+    if surface is None:
+        surface = font.render(text, antialias, colour)
+        TEXT_CACHE[key] = surface
+        if len(TEXT_CACHE) > TEXT_CACHE_SIZE:
+            TEXT_CACHE.popitem(last=False)
+    else:
+        TEXT_CACHE.move_to_end(key)
+    return surface
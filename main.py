@@ -1,17 +1,20 @@
 import chess
-import chess.pgn
 import random
 import pygame
-import datetime
 import os
 import sys
+import time
 
 from components.shared import BOARD, LAYERS, MOUSE, SCREEN_MODE, FLIP_BOARD, VERSION, PLAYER
-from components.render import render_board_bg, render_board, render_mouse_highlight, get_captured_surfaces, render_text, render_legal_moves
+from components.render import render_board_bg, render_board, render_mouse_highlight, get_captured_surfaces, render_text, render_legal_moves, DirtyRegions
 from components.mouse import get_mouse_square
 from components.game.ends import get_game_result
-from components.game.engine import do_move
+from components.game.worker import EngineWorker
+from components.game.ponder import Ponderer
 from components.button import Button
+from components.text import get_text_surface
+from components.frames import FrameScheduler
+from components.archive import ArchiveWriter
 
 def resource_path(relative_path):
     # this works for dev and when using pyinstaller
@@ -54,22 +57,9 @@ def play_move_sound(board, move, white=True):
     else:
         move_opponent_sound.play()
 
-def save_PGN(board):
-    game = chess.pgn.Game.from_board(board)
-    today = datetime.date.today() # get today's date as a string
-    time = datetime.datetime.now().strftime("%H-%M-%S") # get the current time as a string
-    today = f"{today} {time}" # combine the date and time strings
-    today = today.replace(" ", "_") # replace spaces with underscores
-    filename = f"games/{today}.pgn"
-    if not os.path.exists("games"):
-        os.makedirs("games") # create the directory if it doesn't exist
-    with open(filename, "w") as f:
-        print(game, file=f)
-    
-
 screen = pygame.display.set_mode((800, 600))
 MOUSE = pygame.mouse
-clock = pygame.time.Clock()
+FRAMES = FrameScheduler(60)
 
 font = pygame.font.Font(resource_path("assets/font/semibold.otf"), 30)
 running = True
@@ -90,7 +80,44 @@ LAYERS["moves_rank"] = pygame.Surface((200, 600), pygame.SRCALPHA)
 
 BOARD_UNIT = pygame.Surface((400,400), pygame.SRCALPHA)
 
-frame = 0
+render_board_bg(LAYERS["boardbg"], FLIP_BOARD) # never changes, so it's drawn once
+
+LAYER_KEYS = {} # layer name -> what it was last drawn from
+
+SCREEN_REGIONS = DirtyRegions(screen, {
+    "board": pygame.Rect(80, 80, 440, 440),  # the board and its frame
+    "top": pygame.Rect(0, 0, 800, 80),       # square name, version, top captures, game over text
+    "side": pygame.Rect(520, 80, 280, 440),  # thinking... and the top of the takeback button
+    "bottom": pygame.Rect(0, 520, 800, 80),  # bottom captures and the buttons
+})
+
+MENU_REGIONS = DirtyRegions(screen, {"buttons": screen.get_rect()})
+
+ENGINE_DONE = pygame.event.custom_type()
+
+def wake_main_loop():
+    # called from the engine thread, the event just wakes the loop up if it's sleeping
+    try:
+        pygame.event.post(pygame.event.Event(ENGINE_DONE))
+    except pygame.error:
+        pass # pygame already shut down
+
+ENGINE = EngineWorker(on_done=wake_main_loop)
+
+PONDERER = Ponderer() # thinks about the player's likely replies while they choose
+
+ARCHIVE_WRITER = ArchiveWriter(version=VERSION) # finished games are written to games/archive.pgn in the background
+
+def engine_delay():
+    # the engine pretends to think for a random 1-5 seconds
+    return time.monotonic() + random.uniform(1, 5)
+
+MIN_THINK_TIME = 0.25
+
+def start_engine():
+    # search for as long as the pretend delay lasts, so the wait is spent thinking
+    ENGINE.start(BOARD, movetime=max(gen_next_move_deadline - time.monotonic(), MIN_THINK_TIME), ponderer=PONDERER)
+
 game_over = False
 gen_next_move_flag = False
 sel_square = None
@@ -102,30 +129,38 @@ clicking = False
 clicked = False
 
 def game_as_white(dummy):
-    global SCREEN_MODE, FLIP_BOARD, clicking, clicked, gen_next_move_flag, gen_next_move_timer, PLAYER
+    global SCREEN_MODE, FLIP_BOARD, clicking, clicked, gen_next_move_flag, gen_next_move_deadline, PLAYER
     PLAYER = chess.WHITE
+    ENGINE.cancel()
+    PONDERER.stop()
     gen_next_move_flag = False
-    gen_next_move_timer = 0
+    gen_next_move_deadline = 0
     FLIP_BOARD = False
     SCREEN_MODE = "game"
+    SCREEN_REGIONS.invalidate() # the menu was on screen, everything needs drawing
     clicking = False
     clicked = False
 
 def game_as_black(dummy):
-    global SCREEN_MODE, FLIP_BOARD, gen_next_move_flag, gen_next_move_timer, clicking, clicked, PLAYER
+    global SCREEN_MODE, FLIP_BOARD, gen_next_move_flag, gen_next_move_deadline, clicking, clicked, PLAYER
     PLAYER = chess.BLACK
     FLIP_BOARD = True
     SCREEN_MODE = "game"
+    SCREEN_REGIONS.invalidate() # the menu was on screen, everything needs drawing
     gen_next_move_flag = True
-    gen_next_move_timer = frame + random.randint(60, 300)
+    gen_next_move_deadline = engine_delay()
+    start_engine() # think during the delay instead of after it
     clicking = False
     clicked = False
 
 def go_menu(dummy):
     global SCREEN_MODE, clicking, clicked, game_over
     SCREEN_MODE = "menu"
-    if BOARD.is_game_over():
-        save_PGN(BOARD)
+    ENGINE.cancel() # whatever it was thinking about is for a game that's over
+    PONDERER.stop()
+    MENU_REGIONS.invalidate() # the game was on screen, draw the whole menu
+    if BOARD.position_status().game_over:
+        ARCHIVE_WRITER.save(BOARD, PLAYER)
     BOARD.reset()
     game_over = False
     clicking = False
@@ -133,13 +168,15 @@ def go_menu(dummy):
 
 def takeback(dummy):
     print("takeback clicked")
-    global BOARD, gen_next_move_flag, gen_next_move_timer, clicking, clicked, game_over
+    global BOARD, gen_next_move_flag, gen_next_move_deadline, clicking, clicked, game_over
     if (BOARD.turn == PLAYER) and BOARD.move_stack and (BOARD.fullmove_number > 1):
         # only allow takeback if the player is the one to move and there are moves to take back
         BOARD.pop()
         BOARD.pop()
+        ENGINE.cancel()
+        PONDERER.stop() # it was pondering replies to the move we just took back
         gen_next_move_flag = False
-        gen_next_move_timer = 0
+        gen_next_move_deadline = 0
         game_over = False
     else:
         print("takeback not allowed")
@@ -202,10 +239,13 @@ MENU_BUTTON = Button(
 )
 
 while running:
-    for event in pygame.event.get():
+    for event in FRAMES.events(): # sleeps here until something happens, unless the last frame was busy
         if event.type == pygame.QUIT:
             running = False
             break
+        elif event.type == pygame.WINDOWEXPOSED:
+            SCREEN_REGIONS.invalidate() # the window got covered up or restored, redraw all of it
+            MENU_REGIONS.invalidate()
         elif event.type == pygame.KEYDOWN:
             if event.key == pygame.K_ESCAPE:
                 running = False
@@ -226,25 +266,27 @@ while running:
 
 
     if SCREEN_MODE == "menu":
-        screen.fill((218, 177, 99))
+        WHITE_BUTTON.tick(MOUSE.get_pos(), clicking)
+        BLACK_BUTTON.tick(MOUSE.get_pos(), clicking)
 
-        big_king = pygame.transform.scale(icon_surf, (64, 64))
-        big_king_rect = big_king.get_rect(center=(400, 100))
-        screen.blit(big_king, big_king_rect)
+        if MENU_REGIONS.dirty({"buttons": (WHITE_BUTTON.buttoncolour, BLACK_BUTTON.buttoncolour)}): # hover is the only thing that changes
+            screen.fill((218, 177, 99))
 
-        title_image_rect = title_image.get_rect(center=(400, 200))
-        screen.blit(title_image, title_image_rect)
+            big_king = pygame.transform.scale(icon_surf, (64, 64))
+            big_king_rect = big_king.get_rect(center=(400, 100))
+            screen.blit(big_king, big_king_rect)
 
-        text_rect = font.render(f"version {VERSION}", True, (0, 0, 0)).get_rect(center=(400, 300))
-        screen.blit(font.render(f"version {VERSION}", True, (0, 0, 0)), text_rect)
-        
-        WHITE_BUTTON.tick(MOUSE.get_pos(), clicking)
-        WHITE_BUTTON.render()
+            title_image_rect = title_image.get_rect(center=(400, 200))
+            screen.blit(title_image, title_image_rect)
 
-        BLACK_BUTTON.tick(MOUSE.get_pos(), clicking)
-        BLACK_BUTTON.render()
-        
-        pygame.display.flip()
+            text_rect = get_text_surface(font, f"version {VERSION}", (0, 0, 0)).get_rect(center=(400, 300))
+            screen.blit(get_text_surface(font, f"version {VERSION}", (0, 0, 0)), text_rect)
+
+            WHITE_BUTTON.render()
+            BLACK_BUTTON.render()
+
+            pygame.display.flip()
+            FRAMES.keep_busy()
         continue
 
     if SCREEN_MODE == "game_over": # forces only checking for menu button when game is over
@@ -260,13 +302,19 @@ while running:
         clicking = False
 
 
-    if gen_next_move_flag and gen_next_move_timer == frame and not game_over:
-        move, bote_moves = do_move(BOARD)
-        if move is None:
-            continue
-        play_move_sound(BOARD, move, BOARD.turn == chess.WHITE)
-        BOARD.push(move)
-        gen_next_move_flag = False
+    if gen_next_move_flag and time.monotonic() < gen_next_move_deadline:
+        FRAMES.wake_up_at(gen_next_move_deadline) # nothing to do until then, unless the player does something
+    elif gen_next_move_flag and not game_over:
+        engine_result = ENGINE.poll(BOARD) # None until the worker is done, the loop keeps running meanwhile
+        if engine_result is not None:
+            move, bote_moves = engine_result
+            play_move_sound(BOARD, move, BOARD.turn == chess.WHITE)
+            BOARD.push(move)
+            gen_next_move_flag = False
+            if not BOARD.position_status().game_over:
+                PONDERER.start(BOARD) # think about the player's reply while they do
+        elif not ENGINE.busy():
+            start_engine() # nothing in flight for this position (e.g. it got thrown away), ask again
             
 
 
@@ -283,7 +331,8 @@ while running:
                         piece_moves = []
                         piece_move_squares = []
                         gen_next_move_flag = True
-                        gen_next_move_timer = frame + random.randint(60, 300)
+                        gen_next_move_deadline = engine_delay()
+                        start_engine()
                         break
                 else:
                     sel_square = None
@@ -294,7 +343,7 @@ while running:
                 piece = BOARD.piece_at(square)
                 if piece and piece.color == BOARD.turn:
                     sel_square = square
-                    piece_moves = [move for move in BOARD.legal_moves if move.from_square == sel_square]
+                    piece_moves = BOARD.position_status().moves_from(sel_square)
                     piece_move_squares = [move.to_square for move in piece_moves]
                 else:
                     sel_square = None
@@ -307,66 +356,82 @@ while running:
 
         clicked = False
     
-    render_board_bg(LAYERS["boardbg"], FLIP_BOARD)
-
-    BOARD_UNIT.fill((0, 0, 0, 0)) # clear the board unit surface
-    BOARD_UNIT.blit(LAYERS["boardbg"], (0, 0))
-
-    LAYERS["pieces"].fill((0, 0, 0, 0)) 
-    render_board(LAYERS["pieces"], BOARD, FLIP_BOARD)
-    BOARD_UNIT.blit(LAYERS["pieces"], (0, 0))
-
-    screen.fill((218, 177, 99))
-    pygame.draw.rect(screen, (0, 0, 0), (80, 80, 440, 440), 0, border_radius=10)
+    mouse_square = get_mouse_square(MOUSE, (100, 100), FLIP_BOARD)
 
-    LAYERS["boardui"].fill((0, 0, 0, 0)) # clear the ui surface
-    render_mouse_highlight(LAYERS["boardui"], MOUSE, flip=FLIP_BOARD, board_pos=(100, 100))
-    BOARD_UNIT.blit(LAYERS["boardui"], (0, 0))
+    # layers are only redrawn when what's on them changes
+    if LAYER_KEYS.get("pieces") != (BOARD.version, FLIP_BOARD):
+        LAYER_KEYS["pieces"] = (BOARD.version, FLIP_BOARD)
+        LAYERS["pieces"].fill((0, 0, 0, 0))
+        render_board(LAYERS["pieces"], BOARD, FLIP_BOARD)
+        white_captured, black_captured = get_captured_surfaces(BOARD, FLIP_BOARD)
+
+    if LAYER_KEYS.get("legal_moves") != (sel_square, FLIP_BOARD):
+        LAYER_KEYS["legal_moves"] = (sel_square, FLIP_BOARD)
+        LAYERS["legal_moves"].fill((0, 0, 0, 0)) # clear the legal moves surface
+        render_legal_moves(LAYERS["legal_moves"], piece_moves, FLIP_BOARD)
+
+    if LAYER_KEYS.get("boardui") != (mouse_square, FLIP_BOARD):
+        LAYER_KEYS["boardui"] = (mouse_square, FLIP_BOARD)
+        LAYERS["boardui"].fill((0, 0, 0, 0)) # clear the ui surface
+        render_mouse_highlight(LAYERS["boardui"], MOUSE, flip=FLIP_BOARD, board_pos=(100, 100))
+
+    # which parts of the screen look different from last frame, nothing gets drawn if none of them do
+    dirty_rects = SCREEN_REGIONS.dirty({
+        "board": (BOARD.version, FLIP_BOARD, sel_square, mouse_square, game_over),
+        "top": (BOARD.version, FLIP_BOARD, mouse_square, game_over),
+        "side": (gen_next_move_flag, TAKEBACK_BUTTON.buttoncolour),
+        "bottom": (BOARD.version, FLIP_BOARD, TAKEBACK_BUTTON.buttoncolour, MENU_BUTTON.buttoncolour),
+    })
+
+    if dirty_rects:
+        BOARD_UNIT.fill((0, 0, 0, 0)) # clear the board unit surface
+        BOARD_UNIT.blit(LAYERS["boardbg"], (0, 0))
+        BOARD_UNIT.blit(LAYERS["pieces"], (0, 0))
 
-    white_captured, black_captured = get_captured_surfaces(BOARD, FLIP_BOARD)
+        screen.fill((218, 177, 99))
+        pygame.draw.rect(screen, (0, 0, 0), (80, 80, 440, 440), 0, border_radius=10)
 
-    LAYERS["legal_moves"].fill((0, 0, 0, 0)) # clear the legal moves surface
-    render_legal_moves(LAYERS["legal_moves"], piece_moves, FLIP_BOARD)
-    BOARD_UNIT.blit(LAYERS["legal_moves"], (0, 0))
-    
-    LAYERS["screenui"].fill((0, 0, 0, 0)) # clear the ui surface
-    LAYERS["screenui"].blit(white_captured, (100, 30))
-    LAYERS["screenui"].blit(black_captured, (100, 520))
+        BOARD_UNIT.blit(LAYERS["boardui"], (0, 0))
+        BOARD_UNIT.blit(LAYERS["legal_moves"], (0, 0))
 
-    version_text_rect = font.render(f"tinychess {VERSION}", True, (0, 0, 0)).get_rect(topright=(800, 0))
-    LAYERS["screenui"].blit(font.render(f"tinychess {VERSION}", True, (0, 0, 0)), version_text_rect)
+        LAYERS["screenui"].fill((0, 0, 0, 0)) # clear the ui surface
+        LAYERS["screenui"].blit(white_captured, (100, 30))
+        LAYERS["screenui"].blit(black_captured, (100, 520))
 
-    mouse_square = get_mouse_square(MOUSE, (100, 100), FLIP_BOARD)
-    if mouse_square is not None:
-        render_text(LAYERS["screenui"], font, chess.square_name(mouse_square), (0, 0))
+        version_text_rect = get_text_surface(font, f"tinychess {VERSION}", (0, 0, 0)).get_rect(topright=(800, 0))
+        LAYERS["screenui"].blit(get_text_surface(font, f"tinychess {VERSION}", (0, 0, 0)), version_text_rect)
 
-    screen.blit(BOARD_UNIT, (100, 100))
-    screen.blit(LAYERS["screenui"], (0, 0))
+        if mouse_square is not None:
+            render_text(LAYERS["screenui"], font, chess.square_name(mouse_square), (0, 0))
 
-    screen.blit(LAYERS["moves_rank"], (600, 0))
+        screen.blit(BOARD_UNIT, (100, 100))
+        screen.blit(LAYERS["screenui"], (0, 0))
 
-    TAKEBACK_BUTTON.render()
-    TAKEBACK_BUTTON.tick(MOUSE.get_pos(), clicking)
+        screen.blit(LAYERS["moves_rank"], (600, 0))
 
-    MENU_BUTTON.render()
-    MENU_BUTTON.tick(MOUSE.get_pos(), clicking)
+        TAKEBACK_BUTTON.render()
+        MENU_BUTTON.render()
 
-    if gen_next_move_flag:
-        gen_next_move_text = font.render("thinking...", True, (255, 255, 255)).get_rect(center=(650, 200))
-        pygame.draw.rect(screen, (0, 0, 0), gen_next_move_text.inflate(20, 20), border_radius=10)
-        screen.blit(font.render("thinking...", True, (255, 255, 255)), gen_next_move_text)
+        if gen_next_move_flag:
+            gen_next_move_text = get_text_surface(font, "thinking...", (255, 255, 255)).get_rect(center=(650, 200))
+            pygame.draw.rect(screen, (0, 0, 0), gen_next_move_text.inflate(20, 20), border_radius=10)
+            screen.blit(get_text_surface(font, "thinking...", (255, 255, 255)), gen_next_move_text)
 
-    if game_over:
-        _, result = get_game_result(BOARD)
-        result_text = "game over: " + result
+        if game_over:
+            _, result = get_game_result(BOARD)
+            result_text = "game over: " + result
 
-        result_text_rect = font.render(result_text, True, (255, 255, 255)).get_rect(center=(400, 50))
+            result_text_rect = get_text_surface(font, result_text, (255, 255, 255)).get_rect(center=(400, 50))
 
-        pygame.draw.rect(screen, (0, 0, 0), result_text_rect.inflate(20, 20), border_radius=10)
-        screen.blit(font.render(result_text, True, (255, 255, 255)), result_text_rect)
+            pygame.draw.rect(screen, (0, 0, 0), result_text_rect.inflate(20, 20), border_radius=10)
+            screen.blit(get_text_surface(font, result_text, (255, 255, 255)), result_text_rect)
 
-    frame += 1
+        pygame.display.update(dirty_rects) # only send the parts that changed
+        FRAMES.keep_busy()
 
+    TAKEBACK_BUTTON.tick(MOUSE.get_pos(), clicking)
+    MENU_BUTTON.tick(MOUSE.get_pos(), clicking)
 
-    pygame.display.flip()
-    clock.tick(60)
\ No newline at end of file
+ARCHIVE_WRITER.close() # don't quit before the last game is on disk
+PONDERER.stop()
+print(PONDERER.report())
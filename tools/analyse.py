@@ -0,0 +1,199 @@
+# goes back over finished games: for every move, the engine's score for the move that was played and the move it would have played
+# usage: python -m tools.analyse games/archive.pgn --out games/analysis.jsonl --workers 4
+#        python -m tools.analyse games/ --out games/analysis.pgn --depth 3
+# games are read one at a time and handed to a pool of processes, an interrupted run picks up where it left off
+# (games already in --out are skipped) unless --restart is given
+
+import argparse
+import io
+import json
+import os
+import random
+import time
+import chess
+import chess.pgn
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from components.game.board import GameBoard
+from components.game.engine import do_move, get_move_goodness
+from tools.build_book import pgn_files
+
+RESULTS = (b"1-0", b"0-1", b"1/2-1/2", b"*") # how the movetext of every game written out ends
+
+def analyse_game(source, number, pgn, depth, movetime):
+    game = chess.pgn.read_game(io.StringIO(pgn))
+    random.seed(f"{source}:{number}") # ties between equal moves are broken the same way every run
+    board = GameBoard.from_board(game.board())
+    moves = []
+    started = time.perf_counter()
+    for move in game.mainline_moves():
+        colour = board.turn
+        best, scored_moves = do_move(board, depth=depth, movetime=movetime)
+        analysed = {
+            "ply": len(board.move_stack) + 1,
+            "san": board.san(move),
+            "uci": move.uci(),
+            "score": get_move_goodness(board, move, colour),
+            "best": board.san(best),
+            "best_uci": best.uci(),
+            "best_score": get_move_goodness(board, best, colour), # same scale as score, so the two can be compared
+        }
+        if depth is not None or movetime is not None:
+            analysed["search_score"] = dict(scored_moves).get(best) # centipawns (or mate) from the search, a different scale
+        moves.append(analysed)
+        board.push(move)
+    return {
+        "source": source,
+        "game": number,
+        "headers": dict(game.headers),
+        "moves": moves,
+        "seconds": time.perf_counter() - started,
+    }
+
+def annotated_pgn(pgn, record):
+    game = chess.pgn.read_game(io.StringIO(pgn))
+    game.headers["Annotator"] = "tinychess"
+    game.headers["AnalysisSource"] = record["source"]
+    game.headers["AnalysisGame"] = str(record["game"])
+    for node, analysed in zip(game.mainline(), record["moves"]):
+        comment = f"score {analysed['score']}"
+        if analysed["best_uci"] != analysed["uci"]:
+            comment += f", engine prefers {analysed['best']} (score {analysed['best_score']}"
+            if analysed.get("search_score") is not None:
+                comment += f", search {analysed['search_score']}"
+            comment += ")"
+        node.comment = f"{node.comment} {comment}".strip()
+    return str(game)
+
+def drop_partial_line(path):
+    # a run killed halfway through a write leaves half a line at the end, cut it off before appending after it
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+def drop_partial_game(path):
+    # same for pgn: every finished game ends with its result and a blank line, anything after the last one is cut off.
+    # the blank line between the headers and the moves is followed by moves, not a header, so "\n\n[" only matches between games
+    with open(path, "rb+") as f:
+        data = f.read()
+        if not data.strip():
+            return
+        if data.endswith(b"\n\n") and data.rstrip().endswith(RESULTS):
+            return
+        f.truncate(data.rfind(b"\n\n[") + 2 if b"\n\n[" in data else 0)
+
+def done_games(path, output_format):
+    # (source, game number) for everything already written to path, so a rerun can skip them
+    done = set()
+    if not os.path.exists(path):
+        return done
+    if output_format == "jsonl":
+        drop_partial_line(path)
+    else:
+        drop_partial_game(path)
+    with open(path, encoding="utf-8", errors="replace") as f:
+        if output_format == "jsonl":
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # the last line of a run that was killed mid-write
+                done.add((record["source"], record["game"]))
+        else:
+            while True:
+                headers = chess.pgn.read_headers(f)
+                if headers is None:
+                    break
+                if "AnalysisSource" in headers:
+                    done.add((headers["AnalysisSource"], int(headers["AnalysisGame"])))
+    return done
+
+def read_games(paths, done):
+    # (source, game number, pgn text) for every game not analysed yet, one at a time
+    for path in pgn_files(paths):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            number = 0
+            while True:
+                if (path, number) in done:
+                    if not chess.pgn.skip_game(f):
+                        break
+                    number += 1
+                    continue
+                game = chess.pgn.read_game(f)
+                if game is None:
+                    break
+                yield path, number, str(game)
+                number += 1
+
+def main():
+    parser = argparse.ArgumentParser(description="score every move of finished games with the engine")
+    parser.add_argument("paths", nargs="*", default=["games/archive.pgn"], help="pgn files or directories of them (default: games/archive.pgn)")
+    parser.add_argument("--out", default="games/analysis.jsonl", help="where to write the analysis")
+    parser.add_argument("--format", choices=["jsonl", "pgn"], default=None, help="output format (default: from the --out extension)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="how many games to analyse at once")
+    parser.add_argument("--depth", type=int, default=None, help="search this deep for the preferred move instead of scoring one ply")
+    parser.add_argument("--movetime", type=float, default=None, help="search this many seconds per move for the preferred move")
+    parser.add_argument("--restart", action="store_true", help="throw away what's in --out instead of carrying on from it")
+    args = parser.parse_args()
+
+    output_format = args.format or ("pgn" if args.out.endswith(".pgn") else "jsonl")
+    out_dir = os.path.dirname(args.out)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir) # create the directory if it doesn't exist
+    if args.restart and os.path.exists(args.out):
+        os.remove(args.out)
+    done = done_games(args.out, output_format)
+    if done:
+        print(f"resuming, {len(done)} games already analysed")
+
+    games = read_games(args.paths, done)
+    analysed = 0
+    plies = 0
+    started = time.perf_counter()
+    pending = {}
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor, open(args.out, "a", encoding="utf-8") as f:
+        try:
+            while True:
+                while len(pending) < args.workers * 2: # only read ahead a little, the rest stays on disk
+                    game = next(games, None)
+                    if game is None:
+                        break
+                    source, number, pgn = game
+                    pending[executor.submit(analyse_game, source, number, pgn, args.depth, args.movetime)] = pgn
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pgn = pending.pop(future)
+                    record = future.result()
+                    if output_format == "jsonl":
+                        f.write(json.dumps(record) + "\n")
+                    else:
+                        f.write(annotated_pgn(pgn, record) + "\n\n")
+                    f.flush() # everything written is safe to resume from
+
+                    analysed += 1
+                    plies += len(record["moves"])
+                    elapsed = time.perf_counter() - started
+                    print(f"{record['source']} game {record['game'] + 1}: {len(record['moves'])} plies ({record['seconds']:.1f}s), "
+                          f"{analysed} done, {analysed / elapsed:.2f} games/sec")
+        except KeyboardInterrupt:
+            print("interrupted, run again to carry on")
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+            return
+
+    elapsed = time.perf_counter() - started
+    print()
+    print(f"{analysed} games, {plies} moves in {elapsed:.1f}s")
+    print(f"games/sec: {analysed / elapsed if elapsed else 0:.3f}")
+    print(f"moves/sec: {plies / elapsed if elapsed else 0:.1f}")
+    print(f"written to {args.out}")
+
+if __name__ == "__main__":
+    main()
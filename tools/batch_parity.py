@@ -0,0 +1,109 @@
+# checks that the numpy batch evaluation (components/game/batch.py) gives the same numbers as the scalar engine functions
+# (engine.static_move_score for the move terms, which is what score_position_move is built from)
+# usage: python -m tools.batch_parity --games 50 --seed 1
+# exits with 1 if anything disagrees, so it can gate changes to either side
+
+import argparse
+import random
+import sys
+import time
+import chess
+
+import numpy as np
+
+from components.game import engine
+from components.game.batch import PositionBatch, score_children
+from components.game.board import GameBoard
+from components.game.values import PIECES_VALUES
+from tools.bench import CORPUS
+
+def sample_positions(games, seed):
+    rng = random.Random(seed)
+    positions = [GameBoard(fen) for fen in CORPUS.values()]
+    for _ in range(games):
+        board = GameBoard()
+        for _ in range(rng.randint(0, 120)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+            if rng.random() < 0.1:
+                positions.append(board.copy(stack=False))
+    return [board for board in positions if not board.is_game_over()]
+
+def check_features(boards):
+    mismatches = 0
+    batch = PositionBatch.from_boards(boards)
+    material = batch.material()
+    hanging = {colour: batch.hanging_value(colour) for colour in chess.COLORS}
+    in_check = batch.in_check(np.array([int(board.turn) for board in boards]))
+    for row, board in enumerate(boards):
+        for colour in chess.COLORS:
+            expected = sum(PIECES_VALUES[piece.piece_type] for piece in board.piece_map().values() if piece.color == colour)
+            if material[row, int(colour)] != expected:
+                mismatches += 1
+                print(f"material {board.fen()} {chess.COLOR_NAMES[colour]}: batch {material[row, int(colour)]}, scalar {expected}")
+            expected = engine.value_of_pieces_hanging(board, colour)
+            if hanging[colour][row] != expected:
+                mismatches += 1
+                print(f"hanging {board.fen()} {chess.COLOR_NAMES[colour]}: batch {hanging[colour][row]}, scalar {expected}")
+        if bool(in_check[row]) != board.is_check():
+            mismatches += 1
+            print(f"check {board.fen()}: batch {bool(in_check[row])}, scalar {board.is_check()}")
+
+    # every occupied square, from both sides
+    rows, squares, colours = [], [], []
+    for row, board in enumerate(boards):
+        for square in chess.scan_reversed(board.occupied):
+            for colour in chess.COLORS:
+                rows.append(row)
+                squares.append(square)
+                colours.append(int(colour))
+    repeated = PositionBatch(batch.pieces[rows])
+    defended = repeated.is_defended(np.array(squares), np.array(colours))
+    for i, row in enumerate(rows):
+        expected = engine.is_piece_adequately_defended(boards[row], squares[i], bool(colours[i]))
+        if bool(defended[i]) != expected:
+            mismatches += 1
+            print(f"defended {boards[row].fen()} {chess.square_name(squares[i])}: batch {bool(defended[i])}, scalar {expected}")
+    return mismatches
+
+def check_children(boards):
+    mismatches = 0
+    batch_seconds = 0.0
+    scalar_seconds = 0.0
+    for board in boards:
+        started = time.perf_counter()
+        batch_scores = score_children(board)
+        batch_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        scratch = board.copy(stack=False)
+        scalar_scores = [(move, engine.static_move_score(scratch, move, board.turn)) for move in board.legal_moves]
+        scalar_seconds += time.perf_counter() - started
+
+        for (move, batch_score), (_, scalar_score) in zip(batch_scores, scalar_scores):
+            if batch_score != scalar_score:
+                mismatches += 1
+                print(f"score {board.fen()} {move.uci()}: batch {batch_score}, scalar {scalar_score}")
+    return mismatches, batch_seconds, scalar_seconds
+
+def main():
+    parser = argparse.ArgumentParser(description="check the numpy batch evaluation against the scalar one")
+    parser.add_argument("--games", type=int, default=30, help="random games to take positions from")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    boards = sample_positions(args.games, args.seed)
+    mismatches = check_features(boards)
+    child_mismatches, batch_seconds, scalar_seconds = check_children(boards)
+    mismatches += child_mismatches
+
+    moves = sum(board.legal_moves.count() for board in boards)
+    print(f"{len(boards)} positions, {moves} moves, {mismatches} mismatches")
+    print(f"children scored in {batch_seconds * 1000:.1f}ms batched, {scalar_seconds * 1000:.1f}ms scalar")
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
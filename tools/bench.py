@@ -0,0 +1,177 @@
+# times the engine on a fixed set of positions and compares against a stored baseline
+# usage: python -m tools.bench --save bench_baseline.json
+#        python -m tools.bench --baseline bench_baseline.json --threshold 10
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import chess
+
+from components.game.board import GameBoard
+from components.game import engine
+from components.game.see import see
+
+CORPUS = {
+    "opening": "rnbqkb1r/pp2pppp/3p1n2/8/3NP3/8/PPP2PPP/RNBQKB1R w KQkq - 1 5",
+    "opening_2": "r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3",
+    "middlegame": "r2q1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP1B1PPP/R2QKB1R w KQ - 0 10",
+    "middlegame_2": "r1b2rk1/2q1bppp/p2ppn2/1p6/3NP3/1BN1BP2/PPPQ2PP/2KR3R b - - 0 12",
+    "endgame": "8/5pk1/6p1/3R4/5P2/6PK/r7/8 w - - 0 45",
+    "endgame_2": "8/8/4k3/8/2p5/2P1K3/8/8 w - - 0 60",
+}
+
+GAME_LENGTHS = [20, 80, 160] # plies, for get_position_set which replays the whole game
+
+def random_game(plies, seed):
+    # a plain board with a move stack of (up to) this many random plies
+    rng = random.Random(seed)
+    board = chess.Board()
+    while len(board.move_stack) < plies:
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        board.push(rng.choice(moves))
+    return board
+
+def bench_do_move(fen):
+    board = GameBoard(fen)
+    def run():
+        random.seed(0)
+        engine.do_move(board, cache=None, book=None, bitbases=None) # times the scorer, whether or not assets/book.bin and the tables exist
+    return run
+
+def bench_get_move_goodness(fen):
+    board = GameBoard(fen)
+    moves = list(board.legal_moves)
+    def run():
+        for move in moves:
+            engine.get_move_goodness(board, move, board.turn, cache=None)
+    return run
+
+def bench_can_opponent_end_game(fen):
+    board = GameBoard(fen)
+    move = next(iter(board.legal_moves))
+    board.push(move)
+    colour = not board.turn
+    def run():
+        engine.can_opponent_end_game(board, move, colour)
+    return run
+
+def bench_is_piece_adequately_defended(fen):
+    board = GameBoard(fen)
+    squares = list(chess.SquareSet(board.occupied))
+    def run():
+        for square in squares:
+            engine.is_piece_adequately_defended(board, square, board.color_at(square))
+    return run
+
+def bench_see(fen):
+    board = GameBoard(fen)
+    moves = [move for move in board.legal_moves if board.is_capture(move)] or list(board.legal_moves)
+    def run():
+        for move in moves:
+            see(board, move)
+    return run
+
+def bench_get_position_set(plies):
+    board = random_game(plies, seed=plies)
+    def run():
+        engine.get_position_set(board)
+    return run
+
+def get_benchmarks():
+    benchmarks = {}
+    for name, fen in CORPUS.items():
+        benchmarks[f"do_move/{name}"] = bench_do_move(fen)
+        benchmarks[f"get_move_goodness/{name}"] = bench_get_move_goodness(fen)
+        benchmarks[f"can_opponent_end_game/{name}"] = bench_can_opponent_end_game(fen)
+        benchmarks[f"is_piece_adequately_defended/{name}"] = bench_is_piece_adequately_defended(fen)
+        benchmarks[f"see/{name}"] = bench_see(fen)
+    for plies in GAME_LENGTHS:
+        benchmarks[f"get_position_set/{plies}_plies"] = bench_get_position_set(plies)
+    return benchmarks
+
+def time_call(function, min_time, repeats):
+    # best seconds per call over a few rounds, each round long enough to be worth measuring
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        calls *= 2
+
+    best = elapsed / calls
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, (time.perf_counter() - started) / calls)
+    return best, calls
+
+def compare(results, baseline, threshold):
+    # names of everything that got slower than the baseline by more than threshold percent
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["seconds"]
+        change = (result["seconds"] - before) / before * 100
+        result["change"] = change
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the engine")
+    parser.add_argument("--filter", default="", help="only run benchmarks with this in their name")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds each timing round should take at least")
+    parser.add_argument("--repeats", type=int, default=3, help="timing rounds per benchmark, the best one counts")
+    parser.add_argument("--save", help="write the results as json to this file")
+    parser.add_argument("--baseline", help="json file from an earlier --save to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent slowdown that counts as a regression")
+    parser.add_argument("--see", action="store_true", help="score moves with static exchange evaluation (engine.USE_SEE)")
+    args = parser.parse_args()
+    engine.USE_SEE = args.see
+
+    results = {}
+    for name, function in get_benchmarks().items():
+        if args.filter not in name:
+            continue
+        seconds, calls = time_call(function, args.min_time, args.repeats)
+        results[name] = {"seconds": seconds, "calls": calls}
+        print(f"{name:<45} {seconds * 1000:>10.3f}ms", flush=True)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        print()
+        for name, result in results.items():
+            if "change" in result:
+                flag = "  REGRESSION" if name in regressions else ""
+                print(f"{name:<45} {result['change']:>+8.1f}%{flag}")
+
+    if args.save:
+        report = {
+            "python": platform.python_version(),
+            "chess": chess.__version__,
+            "machine": platform.machine(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "results": results,
+        }
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold}%")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
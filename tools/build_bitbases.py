@@ -0,0 +1,248 @@
+# generates the endgame bitbases by retrograde analysis: start from every mate and walk backwards one ply at a time
+# usage: python -m tools.build_bitbases KQK KRK KPK KBNK --out assets/bitbases
+# KQK/KRK/KPK take seconds to a couple of minutes, KBNK is 16 million positions a side and takes a good while longer.
+# KPK needs KQK and KRK built first, for what happens after the pawn promotes
+
+import argparse
+import itertools
+import os
+import time
+import chess
+
+from array import array
+
+from components.game.bitbase import BITBASE_DIR, ENDGAMES, Bitbases, stored_squares, table_size
+from components.game.search import MATE
+
+ESCAPES = 255 # move count for a weak side position that can never be lost (it can take something, or it's stalemate)
+
+def piece_attacks(piece_type, square, occupied):
+    if piece_type == chess.PAWN:
+        return chess.BB_PAWN_ATTACKS[chess.WHITE][square]
+    if piece_type == chess.KNIGHT:
+        return chess.BB_KNIGHT_ATTACKS[square]
+    if piece_type == chess.KING:
+        return chess.BB_KING_ATTACKS[square]
+    attacks = 0
+    if piece_type in (chess.BISHOP, chess.QUEEN):
+        attacks |= chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied]
+    if piece_type in (chess.ROOK, chess.QUEEN):
+        attacks |= chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied]
+        attacks |= chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied]
+    return attacks
+
+class Generator:
+    # the whole table for one ending, unfolded: every square for every piece, white (the strong side) against a lone black king.
+    # white[i] and black[i] are plies to mate + 1 with that side to move, 0 while unknown (and for draws at the end)
+
+    def __init__(self, name, bitbases):
+        self.name = name
+        self.bitbases = bitbases
+        self.piece_types = (chess.KING,) + ENDGAMES[name] # white's pieces, the black king comes last
+        self.count = len(self.piece_types) + 1
+        self.weights = [64 ** (self.count - 1 - i) for i in range(self.count)]
+        size = 64 ** self.count
+        self.white = bytearray(size)
+        self.black = bytearray(size)
+        self.moves_left = bytearray(size) # black moves not yet known to lose, for every black to move position
+        self.buckets = {} # plies to mate -> positions that got that value, in either table
+
+    def add(self, plies, index):
+        if plies not in self.buckets:
+            self.buckets[plies] = array("I")
+        self.buckets[plies].append(index)
+
+    def decode(self, index):
+        squares = []
+        for _ in range(self.count):
+            index, square = divmod(index, 64)
+            squares.append(square)
+        return squares[::-1]
+
+    def white_attacks(self, squares, occupied):
+        attacks = 0
+        for piece_type, square in zip(self.piece_types, squares):
+            attacks |= piece_attacks(piece_type, square, occupied)
+        return attacks
+
+    def valid(self, squares):
+        if len(set(squares)) != self.count:
+            return False
+        if chess.BB_KING_ATTACKS[squares[0]] & chess.BB_SQUARES[squares[-1]]:
+            return False # kings next to each other
+        for piece_type, square in zip(self.piece_types, squares):
+            if piece_type == chess.PAWN and chess.square_rank(square) in (0, 7):
+                return False
+        return True
+
+    def start(self):
+        # every black to move position: mates go in the first bucket, the rest get their number of moves
+        for squares in itertools.product(range(64), repeat=self.count):
+            if not self.valid(squares):
+                continue
+            index = sum(square * weight for square, weight in zip(squares, self.weights))
+            black_king = squares[-1]
+            white_pieces = 0
+            for square in squares[:-1]:
+                white_pieces |= chess.BB_SQUARES[square]
+            attacks = self.white_attacks(squares[:-1], white_pieces) # without the black king, so it can't hide behind itself
+            flight = chess.BB_KING_ATTACKS[black_king] & ~attacks
+            if flight & white_pieces:
+                self.moves_left[index] = ESCAPES # takes an undefended piece, and that's a draw in all of these endings
+            elif flight:
+                self.moves_left[index] = chess.popcount(flight)
+            elif attacks & chess.BB_SQUARES[black_king]:
+                self.black[index] = 1 # mated
+                self.add(0, index)
+            else:
+                self.moves_left[index] = ESCAPES # stalemate
+
+        if chess.PAWN in self.piece_types:
+            self.start_promotions()
+
+    def start_promotions(self):
+        # white to move with the pawn on the seventh: promoting leaves this table, so look the result up in KQK and KRK
+        pawn = self.piece_types.index(chess.PAWN)
+        for squares in itertools.product(range(64), repeat=self.count):
+            if chess.square_rank(squares[pawn]) != 6 or not self.valid(squares) or self.checks_black(squares):
+                continue
+            to_square = squares[pawn] + 8
+            if to_square in squares:
+                continue
+            best = None
+            for promotion in (chess.QUEEN, chess.ROOK):
+                board = chess.Board(None)
+                for piece_type, square in zip(self.piece_types, squares[:-1]):
+                    board.set_piece_at(square, chess.Piece(piece_type, chess.WHITE))
+                board.set_piece_at(squares[-1], chess.Piece(chess.KING, chess.BLACK))
+                board.turn = chess.BLACK
+                board.remove_piece_at(squares[pawn])
+                board.set_piece_at(to_square, chess.Piece(promotion, chess.WHITE))
+                score = self.bitbases.probe(board)
+                if score is None:
+                    raise SystemExit(f"{self.name} needs the K{chess.piece_symbol(promotion).upper()}K table built first")
+                if score < 0:
+                    plies = MATE + score + 1 # black loses in MATE + score after the promotion
+                    best = plies if best is None else min(best, plies)
+            if best is not None:
+                index = sum(square * weight for square, weight in zip(squares, self.weights))
+                self.white[index] = best + 1
+                self.add(best, index)
+
+    def checks_black(self, squares):
+        occupied = 0
+        for square in squares:
+            occupied |= chess.BB_SQUARES[square]
+        return bool(self.white_attacks(squares[:-1], occupied) & chess.BB_SQUARES[squares[-1]])
+
+    def unmoves_white(self, squares, occupied):
+        # every white to move position one white move before this one
+        for i, piece_type in enumerate(self.piece_types):
+            square = squares[i]
+            if piece_type == chess.PAWN:
+                origins = 0
+                if chess.square_rank(square) >= 2 and not occupied & chess.BB_SQUARES[square - 8]:
+                    origins |= chess.BB_SQUARES[square - 8]
+                    if chess.square_rank(square) == 3 and not occupied & chess.BB_SQUARES[square - 16]:
+                        origins |= chess.BB_SQUARES[square - 16]
+            else:
+                origins = piece_attacks(piece_type, square, occupied) & ~occupied
+                if piece_type == chess.KING:
+                    origins &= ~chess.BB_KING_ATTACKS[squares[-1]]
+            for origin in chess.scan_forward(origins):
+                yield i, origin
+
+    def run(self):
+        plies = 0
+        while self.buckets:
+            bucket = self.buckets.pop(plies, None)
+            if bucket is not None:
+                if plies % 2 == 0:
+                    self.back_from_black(bucket, plies)
+                else:
+                    self.back_from_white(bucket, plies)
+            plies += 1
+
+    def back_from_black(self, bucket, plies):
+        # black to move and lost in plies: every white move into it wins in plies + 1
+        for index in bucket:
+            squares = self.decode(index)
+            occupied = 0
+            for square in squares:
+                occupied |= chess.BB_SQUARES[square]
+            for i, origin in self.unmoves_white(squares, occupied):
+                before = list(squares)
+                before[i] = origin
+                if self.checks_black(before):
+                    continue # black would have been in check with white to move
+                before_index = index + (origin - squares[i]) * self.weights[i]
+                value = self.white[before_index]
+                if not value or value > plies + 2:
+                    self.white[before_index] = plies + 2
+                    self.add(plies + 1, before_index)
+
+    def back_from_white(self, bucket, plies):
+        # white to move and winning in plies: every black move into it is one fewer way out
+        weight = self.weights[-1]
+        for index in bucket:
+            if self.white[index] != plies + 1:
+                continue # found a quicker win after it was queued
+            squares = self.decode(index)
+            occupied = 0
+            for square in squares:
+                occupied |= chess.BB_SQUARES[square]
+            origins = chess.BB_KING_ATTACKS[squares[-1]] & ~occupied & ~chess.BB_KING_ATTACKS[squares[0]]
+            for origin in chess.scan_forward(origins):
+                before_index = index + (origin - squares[-1]) * weight
+                left = self.moves_left[before_index]
+                if left == ESCAPES or self.black[before_index]:
+                    continue
+                left -= 1
+                self.moves_left[before_index] = left
+                if not left:
+                    self.black[before_index] = plies + 2
+                    self.add(plies + 1, before_index)
+
+    def stored(self):
+        # fold the full table down to what's kept on disk
+        size = table_size(self.name)
+        out = bytearray(size)
+        for stored in range(size):
+            squares, white_to_move = stored_squares(self.name, stored)
+            if len(set(squares)) != self.count:
+                continue
+            index = sum(square * weight for square, weight in zip(squares, self.weights))
+            out[stored] = self.white[index] if white_to_move else self.black[index]
+        return out
+
+def build(name, out, bitbases):
+    started = time.monotonic()
+    generator = Generator(name, bitbases)
+    generator.start()
+    generator.run()
+    data = generator.stored()
+    path = os.path.join(out, f"{name}.bin")
+    with open(path, "wb") as f:
+        f.write(data)
+    longest = max(data) - 1
+    print(f"{name}: {sum(1 for value in data if value)} won positions, longest mate {longest} plies, {len(data)} bytes, {time.monotonic() - started:.1f}s")
+    table = bitbases.tables.pop(name, None) # so anything built after this one sees the new file
+    if table is not None:
+        table.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("tables", nargs="*", default=list(ENDGAMES), help="which endings to build, in this order")
+    parser.add_argument("--out", default=BITBASE_DIR)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    bitbases = Bitbases(args.out)
+    for name in args.tables:
+        if name not in ENDGAMES:
+            raise SystemExit(f"unknown ending {name}, pick from {', '.join(ENDGAMES)}")
+        build(name, args.out, bitbases)
+    bitbases.close()
+
+if __name__ == "__main__":
+    main()
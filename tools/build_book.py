@@ -0,0 +1,66 @@
+# compiles an opening book for the engine from pgn files
+# usage: python -m tools.build_book games/ more_games.pgn --plies 16 --out assets/book.bin
+
+import argparse
+import os
+import chess
+import chess.pgn
+import chess.polyglot
+
+from components.game.book import BOOK_PATH, encode_move, write_book
+
+RESULT_WEIGHTS = { # how much a move counts for, from the side that played it
+    "win": 2,
+    "draw": 1,
+    "loss": 0,
+}
+
+def pgn_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".pgn"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+def add_game(weights, game, plies):
+    result = game.headers.get("Result", "*")
+    board = game.board()
+    for ply, move in enumerate(game.mainline_moves()):
+        if ply >= plies:
+            break
+        if result == "1/2-1/2":
+            outcome = "draw"
+        elif result in ("1-0", "0-1"):
+            won = (result == "1-0") == (board.turn == chess.WHITE)
+            outcome = "win" if won else "loss"
+        else:
+            outcome = "draw" # unfinished games count like draws
+        key = (chess.polyglot.zobrist_hash(board), encode_move(board, move))
+        weights[key] = weights.get(key, 0) + RESULT_WEIGHTS[outcome]
+        board.push(move)
+
+def main():
+    parser = argparse.ArgumentParser(description="build a polyglot opening book from pgn files")
+    parser.add_argument("paths", nargs="*", default=["games"], help="pgn files or directories of them (default: games/)")
+    parser.add_argument("--plies", type=int, default=16, help="how many plies of each game go into the book")
+    parser.add_argument("--out", default=BOOK_PATH, help="where to write the book")
+    args = parser.parse_args()
+
+    weights = {}
+    games = 0
+    for path in pgn_files(args.paths):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            while True:
+                game = chess.pgn.read_game(f)
+                if game is None:
+                    break
+                add_game(weights, game, args.plies)
+                games += 1
+
+    entries = write_book(args.out, weights)
+    print(f"{games} games, {entries} book entries written to {args.out}")
+
+if __name__ == "__main__":
+    main()
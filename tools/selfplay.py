@@ -0,0 +1,95 @@
+# plays the engine against itself without a window, for load testing engine changes
+# usage: python -m tools.selfplay --games 20 --workers 4 --out games/selfplay.pgn
+
+import argparse
+import datetime
+import os
+import random
+import time
+import chess
+import chess.pgn
+
+from concurrent.futures import ProcessPoolExecutor
+
+from components.game.board import GameBoard
+from components.game.engine import do_move
+from components.game.ends import get_game_result
+
+def play_game(index, seed):
+    random.seed(seed) # same seed, same game
+    board = GameBoard()
+    latencies = []
+    started = time.perf_counter()
+
+    while True:
+        game_over, result = get_game_result(board)
+        if game_over:
+            break
+        move_started = time.perf_counter()
+        move, _ = do_move(board)
+        latencies.append(time.perf_counter() - move_started)
+        board.push(move)
+
+    game = chess.pgn.Game.from_board(board)
+    game.headers["Event"] = "tinychess self-play"
+    game.headers["Date"] = datetime.date.today().strftime("%Y.%m.%d")
+    game.headers["Round"] = str(index + 1)
+    game.headers["White"] = "tinychess"
+    game.headers["Black"] = "tinychess"
+    game.headers["Termination"] = result
+
+    return {
+        "pgn": str(game),
+        "result": result,
+        "plies": len(board.move_stack),
+        "latencies": latencies,
+        "seconds": time.perf_counter() - started,
+    }
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def main():
+    parser = argparse.ArgumentParser(description="play the engine against itself without a window")
+    parser.add_argument("--games", type=int, default=10, help="how many games to play")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="how many games to play at once")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the first game, game n uses seed + n")
+    parser.add_argument("--out", default="games/selfplay.pgn", help="where to write the games")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    out_dir = os.path.dirname(args.out)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir) # create the directory if it doesn't exist
+
+    latencies = []
+    plies = 0
+    results = {}
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor, open(args.out, "w") as f:
+        futures = [executor.submit(play_game, i, seed + i) for i in range(args.games)]
+        for done, future in enumerate(futures, start=1):
+            game = future.result()
+            print(game["pgn"], file=f, end="\n\n")
+            latencies.extend(game["latencies"])
+            plies += game["plies"]
+            results[game["result"]] = results.get(game["result"], 0) + 1
+            print(f"game {done}/{args.games}: {game['result']} in {game['plies']} plies ({game['seconds']:.1f}s)")
+
+    elapsed = time.perf_counter() - started
+    print()
+    print(f"seed {seed}, {args.games} games in {elapsed:.1f}s")
+    print(f"games/sec: {args.games / elapsed:.3f}")
+    print(f"moves/sec: {plies / elapsed:.1f}")
+    print("move latency: " + ", ".join(
+        f"p{int(fraction * 100)} {percentile(latencies, fraction) * 1000:.1f}ms" for fraction in (0.5, 0.9, 0.99)
+    ) + f", max {max(latencies, default=0) * 1000:.1f}ms")
+    for result, count in sorted(results.items(), key=lambda x: x[1], reverse=True):
+        print(f"{count:>4}  {result}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# speaks the uci protocol on stdin/stdout so the engine can be run from any uci gui or tournament manager
+# usage: python -m tools.uci
+# supports uci, isready, ucinewgame, position, go (movetime, nodes, depth, wtime/btime/winc/binc/movestogo, infinite), stop and quit
+
+import sys
+import threading
+import traceback
+import chess
+
+from components.game.board import GameBoard
+from components.game.engine import MOVE_CACHE, do_move
+from components.game.search import MATE, MAX_DEPTH
+
+ENGINE_NAME = "tinychess"
+ENGINE_AUTHOR = "loritsi"
+
+MOVES_TO_GO = 30 # how many moves the clock is shared between when the gui doesn't say
+
+OUTPUT_LOCK = threading.Lock()
+
+def send(line):
+    # the search thread and the command loop both write, one line at a time
+    with OUTPUT_LOCK:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+def format_score(score):
+    if score is None:
+        return "cp 0"
+    if abs(score) >= MATE - MAX_DEPTH * 2:
+        plies = MATE - abs(score)
+        moves = (plies + 1) // 2
+        return f"mate {moves if score > 0 else -moves}"
+    return f"cp {score}"
+
+def parse_position(tokens):
+    # position [startpos | fen <fen>] [moves <move> ...]
+    if "moves" in tokens:
+        split = tokens.index("moves")
+        setup, moves = tokens[:split], tokens[split + 1:]
+    else:
+        setup, moves = tokens, []
+    if setup and setup[0] == "fen":
+        board = GameBoard(" ".join(setup[1:]))
+    else:
+        board = GameBoard()
+    for uci in moves:
+        board.push(board.parse_uci(uci))
+    return board
+
+def parse_go(tokens, turn):
+    # budget for do_move out of a go command: movetime, nodes, depth, and whether bestmove has to wait for stop
+    options = {}
+    for i, token in enumerate(tokens):
+        if token == "infinite":
+            options["infinite"] = True
+        elif i + 1 < len(tokens):
+            try:
+                options[token] = int(tokens[i + 1])
+            except ValueError:
+                pass
+
+    movetime = options["movetime"] / 1000 if "movetime" in options else None
+    clock = options.get("wtime" if turn == chess.WHITE else "btime")
+    if movetime is None and clock is not None and "infinite" not in options:
+        increment = options.get("winc" if turn == chess.WHITE else "binc", 0)
+        moves_to_go = options.get("movestogo", MOVES_TO_GO)
+        movetime = max((clock / moves_to_go + increment * 0.8) / 1000, 0.01)
+        movetime = min(movetime, clock / 1000 * 0.5) # never bet half the clock on one move
+    nodes = options.get("nodes")
+    depth = options.get("depth")
+    if movetime is None and nodes is None and depth is None:
+        depth = MAX_DEPTH # infinite, or a bare go: think until told to stop
+    return movetime, nodes, depth, "infinite" in options
+
+class Searcher:
+    # one search at a time on a background thread, so stop and isready are answered while it thinks
+
+    def __init__(self):
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def start(self, board, movetime, nodes, depth, infinite=False):
+        self.stop()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(board.copy(), movetime, nodes, depth, infinite, self.stop_event), daemon=True)
+        self.thread.start()
+
+    def run(self, board, movetime, nodes, depth, infinite, stop):
+        try:
+            info = {}
+            result = do_move(board, movetime=movetime, nodes=nodes, depth=depth, stop=stop, info=info)
+            if infinite:
+                stop.wait() # the search can finish early (mate, one legal move, book, bitbase) but bestmove has to wait for stop
+            if result is None:
+                send("bestmove 0000") # no legal moves, the gui shouldn't have asked
+                return
+            move, scored_moves = result
+            if info:
+                send(f"info depth {info['depth']} score {format_score(info['score'])} nodes {info['nodes']} "
+                     f"nps {info['nps']} time {int(info['seconds'] * 1000)} pv {move.uci()}")
+            else:
+                send(f"info depth 0 score {format_score(scored_moves[0][1] if len(scored_moves) > 1 else None)} pv {move.uci()}") # book or bitbase move
+            send(f"bestmove {move.uci()}")
+        except Exception as e:
+            send(f"info string error while searching: {e}")
+            traceback.print_exc(file=sys.stderr)
+            fallback = next(iter(board.legal_moves), None) # the gui waits for a bestmove whatever happens
+            send(f"bestmove {fallback.uci() if fallback is not None else '0000'}")
+
+    def stop(self):
+        # the search notices within a few thousand nodes and still sends its bestmove
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+def main():
+    board = GameBoard()
+    searcher = Searcher()
+
+    for line in sys.stdin:
+        tokens = line.split()
+        if not tokens:
+            continue
+        command, arguments = tokens[0], tokens[1:]
+
+        if command == "uci":
+            send(f"id name {ENGINE_NAME}")
+            send(f"id author {ENGINE_AUTHOR}")
+            send("uciok")
+        elif command == "isready":
+            send("readyok")
+        elif command == "ucinewgame":
+            searcher.stop()
+            MOVE_CACHE.clear() # scores from the last game are no use now
+            board = GameBoard()
+        elif command == "position":
+            searcher.stop()
+            try:
+                board = parse_position(arguments)
+            except ValueError as e:
+                send(f"info string bad position: {e}")
+        elif command == "go":
+            movetime, nodes, depth, infinite = parse_go(arguments, board.turn)
+            searcher.start(board, movetime, nodes, depth, infinite)
+        elif command == "stop":
+            searcher.stop()
+        elif command == "quit":
+            break
+        # anything else (debug, setoption, register, ponderhit) is ignored, like the protocol asks
+
+    searcher.stop()
+
+if __name__ == "__main__":
+    main()